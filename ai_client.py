@@ -0,0 +1,175 @@
+import asyncio
+import base64
+import email.utils
+import io
+import logging
+import random
+import time
+
+from PIL import Image
+
+from config import (
+    GEMINI_API_KEY, GEMINI_MODEL, GEMINI_BACKEND, GEMINI_API_BASE, GEMINI_MAX_CONCURRENCY,
+    GEMINI_RPM, GEMINI_TIMEOUT, GEMINI_MAX_RETRIES, GEMINI_MAX_SIDE,
+)
+from media import source_to_file
+import metrics
+from ratelimit import TokenBucket
+
+log = logging.getLogger(__name__)
+
+OCR_PROMPT = "Extract all text from this image. Return only the text, no commentary."
+
+
+class AIError(Exception):
+    pass
+
+
+class RetryableError(AIError):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    # Retry-After is either seconds or an HTTP-date; None (use backoff) if neither
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class GeminiRestBackend:
+    # Talks to the generateContent REST endpoint over one long-lived aiohttp
+    # session. base_url can point at a local fake server in tests.
+
+    def __init__(self, api_key=GEMINI_API_KEY, model=GEMINI_MODEL, base_url=GEMINI_API_BASE):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            import aiohttp
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    async def generate(self, prompt, image_bytes, mime_type):
+        url = f"{self.base_url}/v1beta/models/{self.model}:generateContent"
+        body = {"contents": [{"parts": [
+            {"text": prompt},
+            {"inline_data": {"mime_type": mime_type, "data": base64.b64encode(image_bytes).decode()}},
+        ]}]}
+        import aiohttp
+        try:
+            async with self._get_session().post(url, params={"key": self.api_key}, json=body) as resp:
+                if resp.status == 429 or resp.status >= 500:
+                    raise RetryableError(f"HTTP {resp.status}", parse_retry_after(resp.headers.get("Retry-After")))
+                data = await resp.json(content_type=None)
+                if resp.status != 200:
+                    raise AIError(data.get("error", {}).get("message", f"HTTP {resp.status}"))
+        except aiohttp.ClientError as e:
+            raise RetryableError(f"connection error: {e}")
+        try:
+            parts = data["candidates"][0]["content"]["parts"]
+        except (KeyError, IndexError):
+            raise AIError("empty response")
+        return "".join(part.get("text", "") for part in parts)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class GeminiSDKBackend:
+    # google-generativeai with a single model instance for the process
+
+    def __init__(self, api_key=GEMINI_API_KEY, model=GEMINI_MODEL):
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self._model = genai.GenerativeModel(model)
+
+    async def generate(self, prompt, image_bytes, mime_type):
+        from google.api_core import exceptions
+        try:
+            response = await self._model.generate_content_async(
+                [prompt, {"mime_type": mime_type, "data": image_bytes}]
+            )
+        except (exceptions.TooManyRequests, exceptions.ServerError) as e:
+            raise RetryableError(str(e))
+        except exceptions.GoogleAPIError as e:
+            raise AIError(str(e))
+        return response.text
+
+    async def close(self):
+        pass
+
+
+BACKENDS = {"rest": GeminiRestBackend, "sdk": GeminiSDKBackend}
+
+
+def shrink_image(source, max_side=GEMINI_MAX_SIDE):
+    # Downscale and re-encode as JPEG; phone photos shrink by 5-10x and the
+    # model does not need more than ~2k pixels to read text
+    img = Image.open(source_to_file(source))
+    img.thumbnail((max_side, max_side))
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=85, optimize=True)
+    return buf.getvalue()
+
+
+class AIClient:
+    """Process-wide AI OCR client: bounded concurrency, a token bucket sized to
+    the API quota, per-call timeouts and jittered retries on 429/5xx."""
+
+    def __init__(self, backend=None, max_concurrency=GEMINI_MAX_CONCURRENCY, rpm=GEMINI_RPM,
+                 timeout=GEMINI_TIMEOUT, max_retries=GEMINI_MAX_RETRIES):
+        self._backend = backend
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._bucket = TokenBucket(rpm / 60, capacity=max(1, min(rpm, max_concurrency)))
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = BACKENDS[GEMINI_BACKEND]()
+        return self._backend
+
+    async def ocr(self, source, prompt=OCR_PROMPT):
+        with metrics.timed("gemini"):
+            return await self._ocr(source, prompt)
+
+    async def _ocr(self, source, prompt):
+        # source: image bytes or a path
+        image = await asyncio.to_thread(shrink_image, source)
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self._bucket.acquire()
+                try:
+                    text = await asyncio.wait_for(
+                        self.backend.generate(prompt, image, "image/jpeg"), self.timeout
+                    )
+                    return text.strip() or "No text found."
+                except (RetryableError, asyncio.TimeoutError) as e:
+                    reason = str(e) or "timeout"
+                    if attempt == self.max_retries:
+                        raise AIError(f"gave up after {attempt + 1} attempts: {reason}")
+                    delay = getattr(e, "retry_after", None) or min(30, 2 ** attempt)
+                    delay *= random.uniform(0.5, 1.5)
+                    log.warning("Gemini call failed (%s), retrying in %.1fs", reason, delay)
+                    await asyncio.sleep(delay)
+
+    async def close(self):
+        if self._backend is not None:
+            await self._backend.close()
@@ -0,0 +1,54 @@
+import asyncio
+import functools
+import logging
+
+from config import ALBUM_WAIT
+
+log = logging.getLogger(__name__)
+
+
+class AlbumCollector:
+    """Telegram delivers an album as separate messages sharing a media_group_id.
+    Collect them until no new part has arrived for ``wait`` seconds, then hand
+    the whole album (ordered by message id) to ``callback`` as one job. If the
+    job fails, ``on_error(messages)`` is awaited to tell the user."""
+
+    def __init__(self, callback, wait=ALBUM_WAIT, on_error=None):
+        self.callback = callback
+        self.on_error = on_error
+        self.wait = wait
+        self._albums = {}  # (chat_id, media_group_id) -> [messages, timer]
+        self._tasks = set()
+
+    def add(self, message):
+        key = (message.chat.id, message.media_group_id)
+        entry = self._albums.setdefault(key, [[], None])
+        entry[0].append(message)
+        if entry[1]:
+            entry[1].cancel()
+        entry[1] = asyncio.get_running_loop().call_later(self.wait, self._flush, key)
+
+    def _flush(self, key):
+        messages, _ = self._albums.pop(key)
+        messages.sort(key=lambda m: m.id)
+        self._spawn(self.callback(messages), functools.partial(self._job_done, messages))
+
+    def _spawn(self, coro, done):
+        # Keep a reference until the task ends, or it may be garbage collected
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(done)
+
+    def _job_done(self, messages, task):
+        self._tasks.discard(task)
+        if task.cancelled() or task.exception() is None:
+            return
+        log.error("album job for %d messages in chat %s failed", len(messages), messages[0].chat.id,
+                  exc_info=task.exception())
+        if self.on_error:
+            self._spawn(self.on_error(messages), self._notify_done)
+
+    def _notify_done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.warning("could not tell the user an album failed: %r", task.exception())
@@ -0,0 +1,263 @@
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from config import (
+    ARTIFACT_PATH, ARTIFACT_DIR, ARTIFACT_MEMORY_ITEMS, ARTIFACT_MEMORY_MB, ARTIFACT_DISK_MB,
+    ARTIFACT_TTL_HOURS, ARTIFACT_IMAGE_TTL_MINUTES,
+)
+
+# Names of the files the store writes; nothing else in the directory is touched
+IMAGE_NAME = re.compile(r"[0-9a-f]{32}\.artifact")
+
+
+class Artifact:
+    """What the result buttons need: the OCR text, the Telegram file_id the
+    image can be fetched again with, and the image itself while we keep it
+    (bytes in memory or a file in the artifact directory)."""
+
+    __slots__ = ("file_id", "file_size", "text", "data", "path", "created")
+
+    def __init__(self, file_id, file_size, text, data=None, path=None, created=None):
+        self.file_id = file_id
+        self.file_size = file_size
+        self.text = text
+        self.data = data
+        self.path = path
+        self.created = created or time.time()
+
+    @property
+    def source(self):
+        # Like MediaFile.source; None once the image was dropped
+        return self.data if self.data is not None else self.path
+
+    @property
+    def size(self):
+        return len(self.text.encode("utf-8")) + (len(self.data) if self.data is not None else 0)
+
+
+class ArtifactStore:
+    """Per-result state behind the Satisfied / Ask AI / Reprocess buttons,
+    keyed by (chat_id, message_id).
+
+    Hot entries live in an LRU bounded by ``memory_items`` and
+    ``memory_bytes``. Every entry is also indexed in SQLite, so buttons keep
+    working after a restart; image bytes pushed out of memory spill to files
+    under ``directory`` within ``disk_bytes``. Images are dropped after
+    ``image_ttl`` (they can be fetched again by file_id), whole entries
+    after ``ttl`` without use. Thread-safe so it can be called through
+    asyncio.to_thread.
+    """
+
+    def __init__(self, path=ARTIFACT_PATH, directory=ARTIFACT_DIR, memory_items=ARTIFACT_MEMORY_ITEMS,
+                 memory_bytes=ARTIFACT_MEMORY_MB * 1024 * 1024, disk_bytes=ARTIFACT_DISK_MB * 1024 * 1024,
+                 ttl=ARTIFACT_TTL_HOURS * 3600, image_ttl=ARTIFACT_IMAGE_TTL_MINUTES * 60):
+        self.directory = os.path.abspath(directory)
+        self.memory_items = memory_items
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.ttl = ttl
+        self.image_ttl = image_ttl
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        self._lock = threading.Lock()
+        self._swept = False
+        os.makedirs(self.directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS artifacts ("
+            "chat_id INTEGER NOT NULL, message_id INTEGER NOT NULL, file_id TEXT, file_size INTEGER, "
+            "text TEXT NOT NULL, image_path TEXT, image_bytes INTEGER NOT NULL DEFAULT 0, "
+            "created REAL NOT NULL, accessed REAL NOT NULL, PRIMARY KEY (chat_id, message_id))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS artifacts_accessed ON artifacts(accessed)")
+        self._db.commit()
+        self.spilled = 0
+
+    # --- memory LRU ---
+
+    def _remember(self, key, artifact):
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_used -= old.size
+        self._memory[key] = artifact
+        self._memory_used += artifact.size
+        while self._memory and (len(self._memory) > self.memory_items or self._memory_used > self.memory_bytes):
+            old_key, old = self._memory.popitem(last=False)
+            self._memory_used -= old.size
+            if old.data is not None:
+                self._spill(old_key, old)
+
+    def _spill(self, key, artifact):
+        # Out of memory budget: the image goes to disk if the disk budget allows
+        data, artifact.data = artifact.data, None
+        if len(data) > self.disk_bytes:
+            return
+        artifact.path = self._new_path()
+        with open(artifact.path, "wb") as f:
+            f.write(data)
+        self._db.execute("UPDATE artifacts SET image_path = ?, image_bytes = ? WHERE chat_id = ? AND message_id = ?",
+                         (artifact.path, len(data), *key))
+        self.spilled += 1
+        self._trim_disk()
+
+    def _new_path(self):
+        return os.path.join(self.directory, uuid.uuid4().hex + ".artifact")
+
+    def _trim_disk(self):
+        used = self._db.execute("SELECT COALESCE(SUM(image_bytes), 0) FROM artifacts").fetchone()[0]
+        if used <= self.disk_bytes:
+            return
+        for chat_id, message_id, image_path, size in self._db.execute(
+            "SELECT chat_id, message_id, image_path, image_bytes FROM artifacts "
+            "WHERE image_path IS NOT NULL ORDER BY accessed"
+        ).fetchall():
+            self._drop_image((chat_id, message_id), image_path)
+            used -= size
+            if used <= self.disk_bytes:
+                break
+
+    def _drop_image(self, key, image_path):
+        if image_path:
+            try:
+                os.remove(image_path)
+            except OSError:
+                pass
+        self._db.execute("UPDATE artifacts SET image_path = NULL, image_bytes = 0 WHERE chat_id = ? AND message_id = ?",
+                         key)
+        artifact = self._memory.get(key)
+        if artifact is not None:
+            self._memory_used -= artifact.size
+            artifact.data = artifact.path = None
+            self._memory_used += artifact.size
+
+    # --- public API ---
+
+    def put(self, key, file_id, file_size, text, media=None):
+        """Store the result for (chat_id, message_id). Takes ownership of
+        ``media`` (a media.MediaFile): temp files move into the store."""
+        now = time.time()
+        data = path = None
+        with self._lock:
+            if media is not None and media.data is not None:
+                data = media.data
+            elif media is not None and media.path:
+                # Under the lock, or the first cleanup() could sweep it away
+                path = self._new_path()
+                shutil.move(media.path, path)
+                media.path = None
+            old = self._db.execute("SELECT image_path FROM artifacts WHERE chat_id = ? AND message_id = ?",
+                                   key).fetchone()
+            if old and old[0]:
+                self._drop_image(key, old[0])
+            self._db.execute(
+                "INSERT OR REPLACE INTO artifacts (chat_id, message_id, file_id, file_size, text, image_path, "
+                "image_bytes, created, accessed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, file_id, file_size, text, path, os.path.getsize(path) if path else 0, now, now),
+            )
+            self._remember(key, Artifact(file_id, file_size, text, data, path, now))
+            if path:
+                self._trim_disk()
+            self._db.commit()
+
+    def get(self, key):
+        with self._lock:
+            now = time.time()
+            artifact = self._memory.get(key)
+            if artifact is not None:
+                self._memory.move_to_end(key)
+            else:
+                row = self._db.execute(
+                    "SELECT file_id, file_size, text, image_path, created FROM artifacts "
+                    "WHERE chat_id = ? AND message_id = ?", key
+                ).fetchone()
+                if row is None:
+                    return None
+                file_id, file_size, text, image_path, created = row
+                if image_path and not os.path.exists(image_path):
+                    image_path = None
+                artifact = Artifact(file_id, file_size, text, path=image_path, created=created)
+                self._remember(key, artifact)
+            self._db.execute("UPDATE artifacts SET accessed = ? WHERE chat_id = ? AND message_id = ?", (now, *key))
+            self._db.commit()
+            return artifact
+
+    def set_image(self, key, media):
+        # An image fetched again by file_id; kept like a fresh download
+        artifact = self.get(key)
+        if artifact is not None:
+            self.put(key, artifact.file_id, artifact.file_size, artifact.text, media)
+
+    def delete(self, key):
+        with self._lock:
+            artifact = self._memory.pop(key, None)
+            if artifact is not None:
+                self._memory_used -= artifact.size
+            row = self._db.execute("SELECT image_path FROM artifacts WHERE chat_id = ? AND message_id = ?",
+                                   key).fetchone()
+            if row and row[0]:
+                self._drop_image(key, row[0])
+            self._db.execute("DELETE FROM artifacts WHERE chat_id = ? AND message_id = ?", key)
+            self._db.commit()
+
+    def cleanup(self):
+        """TTL eviction; returns (entries removed, images dropped)."""
+        now = time.time()
+        with self._lock:
+            expired = self._db.execute(
+                "SELECT chat_id, message_id, image_path FROM artifacts WHERE accessed < ?", (now - self.ttl,)
+            ).fetchall()
+            for chat_id, message_id, image_path in expired:
+                self._drop_image((chat_id, message_id), image_path)
+                artifact = self._memory.pop((chat_id, message_id), None)
+                if artifact is not None:
+                    self._memory_used -= artifact.size
+            self._db.execute("DELETE FROM artifacts WHERE accessed < ?", (now - self.ttl,))
+
+            # Images older than image_ttl, on disk or in memory
+            old_images = self._db.execute(
+                "SELECT chat_id, message_id, image_path FROM artifacts WHERE created < ? AND image_path IS NOT NULL",
+                (now - self.image_ttl,)
+            ).fetchall()
+            for chat_id, message_id, image_path in old_images:
+                self._drop_image((chat_id, message_id), image_path)
+            in_memory = [key for key, a in self._memory.items() if a.data is not None and a.created < now - self.image_ttl]
+            for key in in_memory:
+                self._drop_image(key, None)
+
+            if not self._swept:
+                # Files of a previous run that never made it into the index
+                known = {row[0] for row in self._db.execute(
+                    "SELECT image_path FROM artifacts WHERE image_path IS NOT NULL")}
+                for entry in os.scandir(self.directory):
+                    if (IMAGE_NAME.fullmatch(entry.name) and entry.path not in known
+                            and entry.is_file(follow_symlinks=False)):
+                        try:
+                            os.remove(entry.path)
+                        except OSError:
+                            pass
+                self._swept = True
+            self._db.commit()
+        return len(expired), len(old_images) + len(in_memory)
+
+    def stats(self):
+        with self._lock:
+            entries, disk = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(image_bytes), 0) FROM artifacts").fetchone()
+            return {
+                "entries": entries,
+                "memory_items": len(self._memory),
+                "memory_bytes": self._memory_used,
+                "disk_bytes": disk,
+                "spilled": self.spilled,
+            }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
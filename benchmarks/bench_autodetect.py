@@ -0,0 +1,81 @@
+"""Latency and peak RSS of auto-detect OCR versus all SUPPORTED_LANGS at once.
+
+    python benchmarks/bench_autodetect.py --runs 5
+
+Each mode runs in a fresh child process so peak RSS is not shared.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ocr_utils
+from benchmarks.bench_engine import render_sample
+
+MODES = {
+    "all-langs": lambda: "+".join(ocr_utils.SUPPORTED_LANGS),
+    "auto-detect": lambda: None,
+}
+
+
+def run_child(mode, runs):
+    img = render_sample()
+    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as f:
+        path = f.name
+    img.save(path)
+    try:
+        timings = []
+        used = None
+        for _ in range(runs):
+            start = time.perf_counter()
+            text, used = ocr_utils.ocr_image(path, lang=MODES[mode]())
+            timings.append(time.perf_counter() - start)
+    finally:
+        os.remove(path)
+    timings.sort()
+    # ru_maxrss is in KiB on Linux; children covers pytesseract's subprocesses
+    rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+              resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    print(json.dumps({
+        "mode": mode,
+        "lang": used,
+        "mean_ms": sum(timings) / len(timings) * 1000,
+        "p50_ms": timings[len(timings) // 2] * 1000,
+        "peak_rss_mb": rss / 1024,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", choices=MODES)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.runs)
+        return
+
+    results = []
+    for mode in MODES:
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", mode, "--runs", str(args.runs)],
+            capture_output=True, text=True, check=True,
+        )
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    for r in results:
+        print(f"{r['mode']:>12}: mean {r['mean_ms']:8.1f} ms | p50 {r['p50_ms']:8.1f} ms | "
+              f"peak RSS {r['peak_rss_mb']:7.1f} MB | lang {r['lang']}")
+    base, auto = results
+    if auto["mean_ms"]:
+        print(f"auto-detect speedup: {base['mean_ms'] / auto['mean_ms']:.1f}x, "
+              f"RSS saved: {base['peak_rss_mb'] - auto['peak_rss_mb']:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Per-image latency of the Tesseract backends in ocr_utils.
+
+    python benchmarks/bench_engine.py --lang eng+hin --runs 20
+
+Runs offline on a synthetic image; no Telegram or Gemini access needed.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFont
+
+import ocr_utils
+
+SAMPLE_TEXT = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Pack my box with five dozen liquor jugs.",
+    "Sphinx of black quartz, judge my vow.",
+    "How vexingly quick daft zebras jump!",
+]
+
+
+def render_sample(width=1200, font_size=32):
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", font_size)
+    except OSError:
+        font = ImageFont.load_default()
+    line_height = int(font_size * 1.6)
+    img = Image.new("L", (width, line_height * (len(SAMPLE_TEXT) + 1)), 255)
+    draw = ImageDraw.Draw(img)
+    for i, line in enumerate(SAMPLE_TEXT):
+        draw.text((20, 20 + i * line_height), line, fill=0, font=font)
+    return img
+
+
+def bench(engine, img, lang, runs):
+    ocr_utils.OCR_ENGINE = engine
+    start = time.perf_counter()
+    ocr_utils.run_tesseract(img, lang)
+    cold = time.perf_counter() - start
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        ocr_utils.run_tesseract(img, lang)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        "cold_ms": cold * 1000,
+        "mean_ms": statistics.mean(timings) * 1000,
+        "p50_ms": timings[len(timings) // 2] * 1000,
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lang", default="eng")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    img = render_sample()
+    engines = ["pytesseract"]
+    if ocr_utils.load_tesserocr() is not None:
+        engines.append("tesserocr")
+    else:
+        print("tesserocr not installed, only benchmarking pytesseract")
+
+    print(f"lang={args.lang} runs={args.runs} image={img.width}x{img.height}")
+    for engine in engines:
+        r = bench(engine, img, args.lang, args.runs)
+        print(f"{engine:>12}: cold {r['cold_ms']:8.1f} ms | mean {r['mean_ms']:8.1f} ms | "
+              f"p50 {r['p50_ms']:8.1f} ms | p95 {r['p95_ms']:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Per-stage timing breakdown of each preprocessing profile.
+
+    python benchmarks/bench_preprocess.py --width 4000 --runs 5
+
+Use it to pick PREPROCESS_PROFILE for a deployment.
+"""
+import argparse
+import os
+import sys
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import ImageFilter
+
+import preprocess
+from benchmarks.bench_engine import render_sample
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--width", type=int, default=4000, help="simulated photo width in px")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    # A large, slightly blurred and rotated RGB photo of text
+    scale = args.width / 1200
+    img = render_sample(width=1200, font_size=32)
+    img = img.resize((args.width, int(img.height * scale))).rotate(2, fillcolor=255, expand=True)
+    img = img.filter(ImageFilter.GaussianBlur(1)).convert("RGB")
+    print(f"input {img.width}x{img.height}, {args.runs} runs")
+
+    for profile in preprocess.PROFILES:
+        totals = defaultdict(float)
+        for _ in range(args.runs):
+            timings = {}
+            out = preprocess.preprocess(img, profile, timings)
+            for stage, ms in timings.items():
+                totals[stage] += ms
+        total = sum(totals.values()) / args.runs
+        stages = ", ".join(f"{k} {v / args.runs:.1f}" for k, v in totals.items())
+        print(f"{profile:>9}: {total:8.1f} ms -> {out.width}x{out.height} ({stages})")
+
+
+if __name__ == "__main__":
+    main()
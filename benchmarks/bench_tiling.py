@@ -0,0 +1,99 @@
+"""Latency and accuracy of tiled vs whole-image OCR against image height.
+
+    python benchmarks/bench_tiling.py --heights 2000 4000 8000 16000 --workers 4
+
+Renders long "screenshots" of a chat-like column of text, OCRs each one as a
+single pool job and with tiling.ocr_tiled across the pool, and reports wall
+time and character error rate. Runs offline; no Telegram or Gemini access.
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw
+
+from benchmarks import corpus
+from ocr_pool import OCRPool
+from ocr_utils import ocr_image, warm_up
+import tiling
+
+LINES = corpus.TEXTS["eng"] + [
+    "Pack my box with five dozen liquor jugs.",
+    "Sphinx of black quartz, judge my vow.",
+    "How vexingly quick daft zebras jump!",
+    "Meeting moved to 14:30, room B-204.",
+]
+
+
+def render_screenshot(height, width=1080, font_size=30):
+    # Paragraphs of 1-3 lines with wider gaps between them, like a chat log
+    font = corpus.find_font("eng", font_size)
+    if font is None:
+        sys.exit("no font found (set BENCH_FONT_DIR)")
+    img = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(img)
+    truth, y, i = [], 40, 0
+    line_height = int(font_size * 1.5)
+    while y + line_height * 3 < height - 40:
+        for _ in range(1 + i % 3):
+            line = LINES[i % len(LINES)]
+            draw.text((40, y), line, fill=0, font=font)
+            truth.append(line)
+            y += line_height
+            i += 1
+        y += font_size * 2
+    buf = io.BytesIO()
+    img.convert("RGB").save(buf, format="PNG")
+    return buf.getvalue(), "\n".join(truth)
+
+
+async def bench(pool, png, truth, tiled, lang):
+    start = time.perf_counter()
+    if tiled:
+        text, _ = await tiling.ocr_tiled(pool.run, png, lang=lang, spell=False, timeout=pool.timeout)
+    else:
+        text, _ = await pool.run(ocr_image, png, lang=lang, spell=False, timeout=pool.timeout)
+    seconds = time.perf_counter() - start
+    error = text.startswith("OCR error")
+    return seconds, 1.0 if error else corpus.cer(truth, "" if text == "No text found." else text), error
+
+
+async def run(args):
+    pool = OCRPool(workers=args.workers, queue_size=1000, timeout=600, initializer=warm_up, initargs=([args.lang],))
+    await pool.warm_up()
+    print(f"workers={pool.workers} lang={args.lang} runs={args.runs}")
+    print(f"{'height':>7} | {'tiles':>5} | {'whole s':>8} | {'tiled s':>8} | {'speedup':>7} | {'CER whole':>9} | {'CER tiled':>9}")
+    try:
+        for height in args.heights:
+            png, truth = render_screenshot(height)
+            tiles, _ = tiling.plan_tiles(png, lang=args.lang)
+            row = {}
+            for tiled in (False, True):
+                results = [await bench(pool, png, truth, tiled, args.lang) for _ in range(args.runs)]
+                if any(error for _, _, error in results):
+                    print(f"{height}px {'tiled' if tiled else 'whole'}: OCR failed, is Tesseract installed?")
+                row[tiled] = (min(s for s, _, _ in results), results[-1][1])
+            (whole, cer_whole), (split, cer_split) = row[False], row[True]
+            print(f"{height:>7} | {len(tiles):>5} | {whole:8.2f} | {split:8.2f} | {whole / split:6.1f}x | "
+                  f"{cer_whole:9.3f} | {cer_split:9.3f}")
+    finally:
+        pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--heights", nargs="+", type=int, default=[2000, 4000, 8000, 16000])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--lang", default="eng")
+    parser.add_argument("--runs", type=int, default=3, help="best of N wall times")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
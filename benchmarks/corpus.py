@@ -0,0 +1,146 @@
+"""Synthetic OCR corpus with known ground truth, rendered with PIL.
+
+Every sample is a deterministic function of the seed, so two benchmark runs
+(or two machines) see exactly the same images.
+"""
+import io
+import os
+import zlib
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont, features
+
+# Ground-truth lines per Tesseract language (pangrams where available)
+TEXTS = {
+    "eng": ["The quick brown fox jumps over the lazy dog.", "Invoice 2024-118: total $1,349.50"],
+    "spa": ["El veloz murciélago hindú comía feliz cardillo y kiwi.", "La cigüeña tocaba el saxofón detrás del palenque."],
+    "fra": ["Portez ce vieux whisky au juge blond qui fume.", "Voix ambiguë d'un cœur qui au zéphyr préfère les jattes de kiwis."],
+    "deu": ["Victor jagt zwölf Boxkämpfer quer über den großen Sylter Deich.", "Falsches Üben von Xylophonmusik quält jeden größeren Zwerg."],
+    "rus": ["Съешь же ещё этих мягких французских булок, да выпей чаю.", "Широкая электрификация южных губерний даст мощный толчок."],
+    "ukr": ["Чуєш їх, доцю, га? Кумедна ж ти, прощайся без ґольфів!"],
+    "ell": ["Ξεσκεπάζω την ψυχοφθόρα βδελυγμία.", "Γαζέες καὶ μυρτιὲς δὲν θὰ βρῶ πιὰ στὸ χρυσαφὶ ξέφωτο."],
+    "hin": ["यह एक परीक्षण वाक्य है।", "ऋषियों को सताने वाले दुष्ट राक्षसों के राजा रावण का सर्वनाश करने वाले विष्णुवतार भगवान श्रीराम।"],
+    "ara": ["نص حكيم له سر قاطع وذو شأن عظيم مكتوب على ثوب أخضر ومغلف بجلد أزرق."],
+    "chi_sim": ["我能吞下玻璃而不伤身体。", "天地玄黄，宇宙洪荒。"],
+    "jpn": ["私はガラスを食べられます。それは私を傷つけません。"],
+    "kor": ["나는 유리를 먹을 수 있어요. 그래도 아프지 않아요."],
+}
+
+# Scripts that only render correctly with complex text layout (libraqm)
+NEEDS_SHAPING = {"hin", "ara"}
+
+# Candidate fonts per language, first one found wins; BENCH_FONT_DIR is searched first
+_DEJAVU = ["DejaVuSans.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"]
+_CJK = ["/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc", "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+        "NotoSansCJK-Regular.ttc"]
+FONTS = {
+    "hin": ["/usr/share/fonts/truetype/noto/NotoSansDevanagari-Regular.ttf", "NotoSansDevanagari-Regular.ttf",
+            "/usr/share/fonts/truetype/lohit-devanagari/Lohit-Devanagari.ttf"],
+    "ara": ["/usr/share/fonts/truetype/noto/NotoSansArabic-Regular.ttf", "NotoSansArabic-Regular.ttf"] + _DEJAVU,
+    "chi_sim": _CJK,
+    "jpn": _CJK,
+    "kor": _CJK,
+}
+
+FONT_SIZES = (14, 24, 40)
+# name -> (noise sigma, blur radius, rotation degrees, resolution scale)
+DISTORTIONS = {
+    "clean": (0, 0, 0, 1.0),
+    "noise": (25, 0, 0, 1.0),
+    "blur": (0, 1.2, 0, 1.0),
+    "rotate": (0, 0, 3, 1.0),
+    "lowres": (0, 0, 0, 0.5),
+    "photo": (12, 0.8, -2, 1.5),  # a phone shot: noisy, soft, tilted and large
+}
+
+
+def find_font(lang, size):
+    extra = os.getenv("BENCH_FONT_DIR")
+    candidates = FONTS.get(lang, _DEJAVU)
+    if extra:
+        candidates = [os.path.join(extra, os.path.basename(c)) for c in candidates] + candidates
+    for path in candidates:
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            continue
+    return None
+
+
+def available_langs(langs):
+    # (usable, {lang: reason skipped})
+    usable, skipped = [], {}
+    for lang in langs:
+        if lang not in TEXTS:
+            skipped[lang] = "no sample text"
+        elif lang in NEEDS_SHAPING and not features.check("raqm"):
+            skipped[lang] = "Pillow built without libraqm"
+        elif find_font(lang, 24) is None:
+            skipped[lang] = "no font (set BENCH_FONT_DIR)"
+        else:
+            usable.append(lang)
+    return usable, skipped
+
+
+def render(text_lines, font, noise=0, blur=0, rotate=0, scale=1.0, seed=0):
+    size = font.size
+    line_height = int(size * 1.7)
+    width = max(int(font.getlength(line)) for line in text_lines) + 2 * size
+    img = Image.new("L", (width, line_height * len(text_lines) + size), 255)
+    draw = ImageDraw.Draw(img)
+    for i, line in enumerate(text_lines):
+        draw.text((size, size // 2 + i * line_height), line, fill=0, font=font)
+    if scale != 1.0:
+        img = img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))), Image.BICUBIC)
+    if rotate:
+        img = img.rotate(rotate, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    if blur:
+        img = img.filter(ImageFilter.GaussianBlur(blur))
+    if noise:
+        rng = np.random.default_rng(seed)
+        arr = np.asarray(img, dtype=np.float32) + rng.normal(0, noise, (img.height, img.width))
+        img = Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8))
+    return img.convert("RGB")
+
+
+def build(langs, font_sizes=FONT_SIZES, distortions=DISTORTIONS, seed=0):
+    """Yield dicts: id, lang, truth, params and png (encoded image bytes)."""
+    for lang in langs:
+        for size in font_sizes:
+            font = find_font(lang, size)
+            for name, (noise, blur, rotate, scale) in distortions.items():
+                sample_id = f"{lang}-{size}px-{name}"
+                lines = TEXTS[lang]
+                # Noise is seeded per sample, so any subset of the corpus is reproducible too
+                img = render(lines, font, noise, blur, rotate, scale, seed=[seed, zlib.crc32(sample_id.encode())])
+                buf = io.BytesIO()
+                img.save(buf, format="PNG")
+                yield {
+                    "id": sample_id,
+                    "lang": lang,
+                    "truth": "\n".join(lines),
+                    "params": {"font_size": size, "distortion": name, "width": img.width, "height": img.height},
+                    "png": buf.getvalue(),
+                }
+
+
+def _levenshtein(a, b):
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def cer(truth, hypothesis):
+    # Character error rate with whitespace runs collapsed, so line wrapping
+    # differences are not counted as errors
+    truth = " ".join(truth.split())
+    hypothesis = " ".join(hypothesis.split())
+    if not truth:
+        return float(bool(hypothesis))
+    return _levenshtein(truth, hypothesis) / len(truth)
@@ -0,0 +1,258 @@
+"""Offline OCR benchmark and accuracy-regression suite.
+
+    python benchmarks/suite.py run --out before.json
+    # ...change preprocess.py / ocr_utils.py...
+    python benchmarks/suite.py run --out after.json --baseline before.json
+    python benchmarks/suite.py diff before.json after.json --max-slowdown 0.1
+
+Renders a synthetic corpus (benchmarks/corpus.py) across scripts, font sizes,
+noise, blur, rotation and resolution, runs ocr_utils.ocr_image under each
+configuration and reports throughput, p50/p95 latency, peak RSS and character
+error rate. Each configuration runs in a fresh child process so peak RSS is
+its own. No Telegram or Gemini access is needed.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import corpus
+
+DEFAULT_LANGS = ["eng", "spa", "deu", "rus", "ell", "hin", "ara", "chi_sim", "jpn", "kor"]
+
+# name -> overrides applied in the child before running the corpus
+CONFIGS = {
+    "fast": {"profile": "fast"},
+    "balanced": {"profile": "balanced"},
+    "quality": {"profile": "quality"},
+    "balanced-nospell": {"profile": "balanced", "spell": False},
+    "balanced-autodetect": {"profile": "balanced", "autodetect": True},
+    "balanced-pytesseract": {"profile": "balanced", "engine": "pytesseract"},
+}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def _mean_by(samples, key):
+    groups = defaultdict(list)
+    for s in samples:
+        groups[key(s)].append(s["cer"])
+    return {k: statistics.mean(v) for k, v in sorted(groups.items())}
+
+
+def run_child(name, langs, font_sizes, distortions, seed):
+    import ocr_utils
+
+    config = CONFIGS[name]
+    ocr_utils.PREPROCESS_PROFILE = config.get("profile", ocr_utils.PREPROCESS_PROFILE)
+    ocr_utils.OCR_ENGINE = config.get("engine", ocr_utils.OCR_ENGINE)
+    spell = config.get("spell", True)
+
+    samples = list(corpus.build(langs, font_sizes, {d: corpus.DISTORTIONS[d] for d in distortions}, seed))
+    # The first call loads traineddata; report it apart from steady state
+    start = time.perf_counter()
+    ocr_utils.ocr_image(samples[0]["png"], lang=samples[0]["lang"], spell=spell)
+    cold_ms = (time.perf_counter() - start) * 1000
+
+    results = []
+    wall = time.perf_counter()
+    for sample in samples:
+        lang = None if config.get("autodetect") else sample["lang"]
+        start = time.perf_counter()
+        text, used = ocr_utils.ocr_image(sample["png"], lang=lang, spell=spell)
+        ms = (time.perf_counter() - start) * 1000
+        error = text.startswith("OCR error")
+        results.append({
+            "id": sample["id"],
+            "lang": sample["lang"],
+            "lang_used": used,
+            **sample["params"],
+            "ms": round(ms, 2),
+            "cer": 1.0 if error else round(corpus.cer(sample["truth"], "" if text == "No text found." else text), 4),
+            "error": text if error else None,
+        })
+    wall = time.perf_counter() - wall
+
+    # ru_maxrss is in KiB on Linux; children covers pytesseract's subprocesses
+    rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+              resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    latencies = [r["ms"] for r in results]
+    summary = {
+        "samples": len(results),
+        "errors": sum(1 for r in results if r["error"]),
+        "throughput_ips": len(results) / wall if wall else 0.0,
+        "cold_ms": cold_ms,
+        "mean_ms": statistics.mean(latencies),
+        "p50_ms": percentile(latencies, 0.5),
+        "p95_ms": percentile(latencies, 0.95),
+        "peak_rss_mb": rss / 1024,
+        "cer_mean": statistics.mean(r["cer"] for r in results),
+    }
+    print(json.dumps({
+        "config": config,
+        "summary": summary,
+        "cer_by_lang": _mean_by(results, lambda r: r["lang"]),
+        "cer_by_distortion": _mean_by(results, lambda r: r["distortion"]),
+        "cer_by_font_size": _mean_by(results, lambda r: str(r["font_size"])),
+        "samples": results,
+    }))
+
+
+def _meta(langs, skipped, args):
+    try:
+        import pytesseract
+        tesseract = str(pytesseract.get_tesseract_version())
+    except Exception:
+        tesseract = None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "tesseract": tesseract,
+        "langs": langs,
+        "skipped_langs": skipped,
+        "font_sizes": args.font_sizes,
+        "distortions": args.distortions,
+        "seed": args.seed,
+    }
+
+
+def cmd_run(args):
+    langs, skipped = corpus.available_langs(args.langs)
+    for lang, reason in skipped.items():
+        print(f"skipping {lang}: {reason}", file=sys.stderr)
+    if not langs:
+        sys.exit("no language can be rendered, nothing to benchmark")
+
+    report = {"meta": _meta(langs, skipped, args), "configs": {}}
+    for name in args.configs:
+        print(f"running {name}...", file=sys.stderr)
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "child", name, "--langs", *langs,
+             "--font-sizes", *map(str, args.font_sizes), "--distortions", *args.distortions, "--seed", str(args.seed)],
+            capture_output=True, text=True, check=True,
+        )
+        report["configs"][name] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    print_report(report)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=1, ensure_ascii=False)
+        print(f"saved {args.out}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not diff(baseline, report, args):
+            sys.exit(1)
+
+
+def print_report(report):
+    print(f"{'config':>22} | {'img/s':>6} | {'p50 ms':>8} | {'p95 ms':>8} | {'RSS MB':>7} | {'CER':>6} | errors")
+    for name, result in report["configs"].items():
+        s = result["summary"]
+        print(f"{name:>22} | {s['throughput_ips']:6.2f} | {s['p50_ms']:8.1f} | {s['p95_ms']:8.1f} | "
+              f"{s['peak_rss_mb']:7.1f} | {s['cer_mean']:6.3f} | {s['errors']}")
+    for name, result in report["configs"].items():
+        by_lang = ", ".join(f"{k} {v:.3f}" for k, v in result["cer_by_lang"].items())
+        by_dist = ", ".join(f"{k} {v:.3f}" for k, v in result["cer_by_distortion"].items())
+        print(f"{name}: CER by lang: {by_lang}\n{' ' * len(name)}  CER by distortion: {by_dist}")
+
+
+def diff(base, new, args):
+    """Print per-config deltas; returns False if any threshold is exceeded."""
+    if base["meta"].get("langs") != new["meta"].get("langs") or base["meta"].get("seed") != new["meta"].get("seed"):
+        print("warning: runs used different corpora, CER is not directly comparable")
+    ok = True
+    print(f"{'config':>22} | {'p50 ms':>18} | {'p95 ms':>18} | {'RSS MB':>16} | {'CER':>16}")
+    for name in new["configs"]:
+        if name not in base["configs"]:
+            continue
+        b, n = base["configs"][name]["summary"], new["configs"][name]["summary"]
+        problems = []
+        for key in ("p50_ms", "p95_ms"):
+            if b[key] and (n[key] - b[key]) / b[key] > args.max_slowdown:
+                problems.append(f"{key} +{(n[key] - b[key]) / b[key]:.0%}")
+        if b["peak_rss_mb"] and (n["peak_rss_mb"] - b["peak_rss_mb"]) / b["peak_rss_mb"] > args.max_rss_increase:
+            problems.append(f"RSS +{(n['peak_rss_mb'] - b['peak_rss_mb']) / b['peak_rss_mb']:.0%}")
+        if n["cer_mean"] - b["cer_mean"] > args.max_cer_increase:
+            problems.append(f"CER +{n['cer_mean'] - b['cer_mean']:.3f}")
+
+        def cell(key, fmt):
+            return f"{format(b[key], fmt)} -> {format(n[key], fmt)}"
+        print(f"{name:>22} | {cell('p50_ms', '7.1f'):>18} | {cell('p95_ms', '7.1f'):>18} | "
+              f"{cell('peak_rss_mb', '6.1f'):>16} | {cell('cer_mean', '6.3f'):>16}"
+              + (f"  REGRESSION: {', '.join(problems)}" if problems else ""))
+        ok = ok and not problems
+    print("OK" if ok else "regression threshold exceeded")
+    return ok
+
+
+def cmd_diff(args):
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    if not diff(base, new, args):
+        sys.exit(1)
+
+
+def _add_thresholds(parser):
+    parser.add_argument("--max-slowdown", type=float, default=0.10, help="allowed relative p50/p95 increase")
+    parser.add_argument("--max-rss-increase", type=float, default=0.20, help="allowed relative peak RSS increase")
+    parser.add_argument("--max-cer-increase", type=float, default=0.01, help="allowed absolute CER increase")
+
+
+def _add_corpus(parser):
+    parser.add_argument("--langs", nargs="+", default=DEFAULT_LANGS)
+    parser.add_argument("--font-sizes", nargs="+", type=int, default=list(corpus.FONT_SIZES))
+    parser.add_argument("--distortions", nargs="+", choices=corpus.DISTORTIONS, default=list(corpus.DISTORTIONS))
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="benchmark configurations and optionally compare with a baseline")
+    _add_corpus(run)
+    run.add_argument("--configs", nargs="+", choices=CONFIGS, default=["fast", "balanced", "quality"])
+    run.add_argument("--out", help="write the JSON report here")
+    run.add_argument("--baseline", help="JSON report to compare against; exits 1 on regression")
+    _add_thresholds(run)
+    run.set_defaults(func=cmd_run)
+
+    d = sub.add_parser("diff", help="compare two saved reports; exits 1 on regression")
+    d.add_argument("base")
+    d.add_argument("new")
+    _add_thresholds(d)
+    d.set_defaults(func=cmd_diff)
+
+    child = sub.add_parser("child")
+    child.add_argument("name", choices=CONFIGS)
+    _add_corpus(child)
+    child.set_defaults(func=lambda a: run_child(a.name, a.langs, a.font_sizes, a.distortions, a.seed))
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
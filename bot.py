@@ -0,0 +1,865 @@
+import logging
+logging.basicConfig(level=logging.INFO)
+import startup  # first: times everything below
+
+from pyrogram import Client, filters, idle
+from config import (
+    API_ID, API_HASH, BOT_TOKEN, ADMIN_IDS, OCR_JOB_TIMEOUT, SCHED_SMALL_IMAGE_BYTES, METRICS_PORT,
+    OCR_MODE, JOBQUEUE_POLL_INTERVAL, WARMUP_TIMEOUT, TILE_MIN_HEIGHT, NEAR_DUP_MAX_ITEMS,
+    ARTIFACT_CLEANUP_INTERVAL,
+)
+from ocr_utils import ocr_image, ocr_page, warm_up, SUPPORTED_LANGS, PIPELINE_VERSION
+from documents import document_kind, plan_pages, join_pages
+from tiling import needs_tiling, ocr_tiled
+from progressive import ocr_progressive, worth_splitting
+from albums import AlbumCollector
+from ai_client import AIClient
+from ocr_pool import OCRPool, QueueFull
+from scheduler import FairScheduler, RateLimited
+from result_cache import ResultCache, file_key, content_key, variant
+from near_dup import NearDuplicateIndex, image_hash
+from artifacts import ArtifactStore
+from status import OutboundLimiter, StatusMessage
+from storage import Storage
+from jobqueue import JobQueue
+import media as media_io
+from broadcast import Broadcaster
+import metrics
+import reqlog
+from pyrogram.types import Message, BotCommand, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
+from pyrogram.enums import ParseMode, ChatType, ChatMemberStatus
+import os
+import io
+import asyncio
+from html import escape
+import time
+import random
+import datetime
+import subprocess
+
+# Track bot start time
+BOT_START_TIME = time.time()
+startup.timer.mark("imports")
+
+SATISFIED_ALTS = [
+    "✅ Done", "🙌 All Good", "👍 Looks Good", "🎯 Accurate", "✅ Text is Correct", "💯 Perfect!", "✅ Satisfied"
+]
+USE_AI_ALTS = [
+    "🤖 Ask AI", "🧠 Refine with AI", "✍️ Improve with AI", "🔍 Clarify with AI", "💬 AI Help", "🤔 Not Clear? Use AI", "🚀 Boost with AI"
+]
+
+#ADMIN_USERNAME = "@sardonic_001"
+
+AI_QUOTA_LIMIT = 5  # per user per day
+MAX_MESSAGE_TEXT = 3800  # longer results are sent as a .txt document
+
+app = Client("ocrbot", api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN)
+
+# Users, preferences, quotas and counters (SQLite, imports the old .txt files once)
+store = Storage()
+
+# Worker processes for OCR, keeps Tesseract off the event loop; each loads
+# its language models before taking jobs
+ocr_pool = OCRPool(initializer=warm_up)
+scheduler = FairScheduler(capacity=ocr_pool.workers)
+
+# OCR results keyed by Telegram file id and image hash
+result_cache = ResultCache()
+# Perceptual hashes of OCRed images, pointing at their cached results
+near_dups = NearDuplicateIndex() if NEAR_DUP_MAX_ITEMS else None
+# Text, file_id and image behind each result's buttons, keyed by (chat_id, message_id)
+artifacts = ArtifactStore()
+# Status messages, results and broadcasts go through one limiter, per chat and overall
+outbound = OutboundLimiter()
+
+# Shared, rate-limited Gemini client
+ai_client = AIClient()
+
+# Resumable /broadcast sender
+broadcaster = Broadcaster(app, store, outbound)
+
+# Distributed mode: OCR jobs go to a durable queue served by worker.py processes
+job_queue = JobQueue() if OCR_MODE == "distributed" else None
+remote_jobs = {}  # job_id -> (message, status message, request logger) while this process is up
+
+# Album parts are gathered into one batch job, replying to the first part
+albums = AlbumCollector(
+    lambda messages: run_batch_ocr(messages[0], messages),
+    on_error=lambda messages: messages[0].reply("⚠️ Something went wrong while reading this album. Please try again."),
+)
+
+# Set once startup has finished; /readyz reports it
+bot_ready = False
+startup.timer.mark("state")
+
+# Scrape-time views of the queue, workers and cache for /metrics
+def register_metrics():
+    metrics.gauge("ocrbot_queue_depth", "OCR jobs waiting for a worker", lambda: {
+        (("lane", "priority"),): scheduler.stats()["waiting_priority"],
+        (("lane", "normal"),): scheduler.stats()["waiting_normal"],
+    })
+    metrics.gauge("ocrbot_jobs_running", "OCR jobs holding a worker slot", lambda: scheduler.stats()["running"])
+    metrics.gauge("ocrbot_worker_utilization", "Share of OCR workers busy", lambda: ocr_pool.running / ocr_pool.workers)
+    metrics.gauge("ocrbot_workers", "OCR worker processes", lambda: ocr_pool.workers)
+    metrics.gauge("ocrbot_scheduler_rejected_total", "OCR jobs refused by the scheduler", lambda: {
+        (("reason", "queue_full"),): scheduler.rejected,
+        (("reason", "rate_limited"),): scheduler.rate_limited,
+    }, kind="counter")
+    metrics.gauge("ocrbot_cache_lookups_total", "Result cache lookups by outcome", lambda: {
+        (("result", "memory_hit"),): result_cache.stats()["memory_hits"],
+        (("result", "disk_hit"),): result_cache.stats()["disk_hits"],
+        (("result", "miss"),): result_cache.stats()["misses"],
+    }, kind="counter")
+    if near_dups:
+        metrics.gauge("ocrbot_near_dup_lookups_total", "Near-duplicate index lookups by outcome", lambda: {
+            (("result", "hit"),): near_dups.hits,
+            (("result", "miss"),): near_dups.misses,
+        }, kind="counter")
+        metrics.gauge("ocrbot_near_dup_items", "Images in the near-duplicate index", lambda: near_dups.stats()["items"])
+    if job_queue:
+        metrics.gauge("ocrbot_remote_jobs", "Distributed-mode jobs not yet delivered, by state", lambda: {
+            (("state", state),): count for state, count in job_queue.stats().items() if state != "dead_total"
+        })
+    metrics.gauge("ocrbot_artifacts", "Results kept for their buttons", lambda: artifacts.stats()["entries"])
+    metrics.gauge("ocrbot_artifact_bytes", "Bytes of kept images and texts, by where", lambda: {
+        (("where", "memory"),): artifacts.stats()["memory_bytes"],
+        (("where", "disk"),): artifacts.stats()["disk_bytes"],
+    })
+    metrics.gauge("ocrbot_startup_seconds", "Time from process start to ready, by phase", startup.timer.gauge)
+
+register_metrics()
+
+def get_ai_quota_left(user_id):
+    if user_id in ADMIN_IDS:
+        return float('inf')
+    return max(0, AI_QUOTA_LIMIT - store.ai_used_today(user_id))
+
+# Background cleanup of expired artifacts and old images
+async def cleanup_artifacts():
+    while True:
+        try:
+            expired, images = await asyncio.to_thread(artifacts.cleanup)
+            if expired or images:
+                logging.info("Artifact cleanup: %d entries expired, %d images dropped", expired, images)
+        except Exception as e:
+            logging.warning("Artifact cleanup failed: %r", e)
+        await asyncio.sleep(ARTIFACT_CLEANUP_INTERVAL)
+
+async def set_commands(client):
+    await client.set_bot_commands([
+        BotCommand("start", "Start the bot"),
+        BotCommand("ocr", "Extract text from image"),
+        BotCommand("help", "How to use the bot"),
+        BotCommand("lang", "Set OCR language"),
+        BotCommand("langlist", "List supported OCR languages"),
+        BotCommand("spell", "Turn spell correction on or off"),
+    ], language_code="en")
+    await client.set_bot_commands([
+        BotCommand("start", "बॉट शुरू करें"),
+        BotCommand("ocr", "चित्र से टेक्स्ट निकालें"),
+        BotCommand("help", "बॉट का उपयोग कैसे करें"),
+        BotCommand("lang", "OCR भाषा सेट करें"),
+        BotCommand("langlist", "समर्थित भाषाओं की सूची"),
+        BotCommand("spell", "वर्तनी सुधार चालू या बंद करें"),
+    ], language_code="hi")
+
+@app.on_message(filters.command("start"))
+async def start_handler(client, message):
+    await message.reply(
+        "<b>👋 Hi! I'm your OCR bot.</b>\n\n"
+        "Send me an image (in group or private) and I’ll extract the text from it.\n\n"
+        "<b>Commands:</b>\n"
+        "<code>/ocr</code> - Extract text from image (just send an image)\n"
+        "<code>/lang &lt;lang&gt;</code> - Set OCR language (e.g., eng, hin, eng+hin)\n"
+        "<code>/langlist</code> - List supported OCR languages\n"
+        "<code>/spell on|off</code> - Turn spell correction on or off for this chat\n"
+        "<code>/help</code> - How to use the bot\n",
+        parse_mode=ParseMode.HTML
+    )
+
+def get_media(msg):
+    return msg.photo or msg.document or msg.sticker
+
+def media_type(msg):
+    if msg.photo:
+        return "photo"
+    if msg.sticker:
+        return "sticker"
+    return getattr(msg.document, "mime_type", None) or "document"
+
+# Photos, stickers, image documents and PDF/TIFF documents
+def is_ocr_media(msg):
+    if msg.photo or msg.sticker:
+        return True
+    mime = getattr(msg.document, "mime_type", None) or ""
+    return bool(msg.document) and (mime.startswith("image/") or document_kind(mime) is not None)
+
+def near_duplicate_text(phash, lang, spell):
+    key = near_dups.lookup(phash, variant(lang, PIPELINE_VERSION, spell))
+    return result_cache.get(key) if key else None
+
+# Shared OCR flow for /ocr and direct private media
+# reprocess=True (the Reprocess button) skips the result cache and near-duplicates
+async def run_ocr(message: Message, media_msg: Message, rlog=None, reprocess=False):
+    rlog = rlog or reqlog.for_message(message)
+    media = get_media(media_msg)
+    if document_kind(getattr(media, "mime_type", None)):
+        await run_batch_ocr(message, [media_msg], rlog)
+        return
+    lang = store.get_lang(message.from_user.id)
+    spell = store.get_spell(message.chat.id)
+    store.log_user(message.from_user)
+
+    # Cheap lookup before downloading: the same file keeps its file_unique_id across chats
+    tg_key = file_key(media.file_unique_id, lang, PIPELINE_VERSION, spell)
+    image = None
+    status = None
+    near_duplicate = False
+    text = None if reprocess else await asyncio.to_thread(result_cache.get, tg_key, False)
+    try:
+        if text is None:
+            user_id = message.from_user.id
+            if user_id not in ADMIN_IDS:
+                try:
+                    scheduler.check_rate(user_id)
+                except RateLimited:
+                    metrics.REQUESTS.inc(outcome="rate_limited")
+                    rlog.event("rate_limited")
+                    await message.reply("🐢 You are sending images too fast. Please wait a moment and try again.")
+                    return
+            if job_queue:
+                await submit_remote(message, [media_msg], rlog)
+                return
+            # Only "typing…" at first; a status message appears if this takes a while
+            status = StatusMessage(outbound, message).start("📥 Downloading image...")
+            with metrics.timed("download"):
+                image = await media_io.download(media_msg, media)
+            rlog.event("downloaded", size=media.file_size, in_memory=image.data is not None)
+            hash_key = await asyncio.to_thread(lambda: content_key(image.read(), lang, PIPELINE_VERSION, spell))
+            text = None if reprocess else await asyncio.to_thread(result_cache.get, hash_key)
+            phash = await asyncio.to_thread(image_hash, image.source) if near_dups and text is None else None
+            if text is not None:
+                await asyncio.to_thread(result_cache.put, [tg_key], text)
+            elif phash and not reprocess:
+                # Not cached under this file's keys: its own OCR stays one Reprocess tap away
+                text = await asyncio.to_thread(near_duplicate_text, phash, lang, spell)
+                near_duplicate = text is not None
+                if near_duplicate:
+                    rlog.event("near_duplicate")
+            if text is None:
+                hint = store.get_detected_lang(message.from_user.id)
+                # Admins and small images skip ahead of big jobs
+                priority = user_id in ADMIN_IDS or 0 < (media.file_size or 0) <= SCHED_SMALL_IMAGE_BYTES
+                started = time.monotonic()
+                result = await ocr_with_pool(image, lang, hint, spell, status, user_id, message.chat.id, priority)
+                if result is None:
+                    metrics.REQUESTS.inc(outcome="rejected")
+                    rlog.event("rejected", level=logging.WARNING, reason="queue_full")
+                    image.discard()
+                    return
+                text, used_lang = result
+                rlog.event("ocr_done", lang=used_lang, chars=len(text), seconds=f"{time.monotonic() - started:.2f}",
+                           priority=priority, error=text.startswith("OCR error"))
+                if not lang and used_lang and not text.startswith("OCR error"):
+                    store.set_detected_lang(message.from_user.id, used_lang)
+                if not text.startswith("OCR error"):
+                    await asyncio.to_thread(result_cache.put, [tg_key, hash_key], text)
+                    if phash:
+                        await asyncio.to_thread(near_dups.add, phash, hash_key)
+
+        if not text.strip():
+            text = "No text found."
+        if image is None:
+            outcome = "cached"
+        elif near_duplicate:
+            outcome = "near_duplicate"
+        else:
+            outcome = "error" if text.startswith("OCR error") else "ok"
+        metrics.REQUESTS.inc(outcome=outcome)
+        rlog.event("reply", outcome=outcome)
+        with metrics.timed("send"):
+            await send_result(message, text, reprocess=near_duplicate, status=status)
+        # Kept for the buttons; the store owns the image now, cache hits keep only the file_id
+        await asyncio.to_thread(artifacts.put, (message.chat.id, message.id), media.file_id, media.file_size, text, image)
+        store.incr("total")
+    finally:
+        # Only still running if something failed on the way
+        if status:
+            await status.close()
+
+# OCR of several images and/or PDF/TIFF pages as one job with one combined reply
+async def run_batch_ocr(message: Message, media_msgs, rlog=None):
+    rlog = rlog or reqlog.for_message(message)
+    if not media_msgs:
+        await message.reply("⚠️ This album has no images, PDFs or TIFFs to read.")
+        return
+    user_id = message.from_user.id
+    lang = store.get_lang(user_id)
+    spell = store.get_spell(message.chat.id)
+    hint = store.get_detected_lang(user_id)
+    store.log_user(message.from_user)
+    if user_id not in ADMIN_IDS:
+        try:
+            scheduler.check_rate(user_id, len(media_msgs))
+        except RateLimited:
+            metrics.REQUESTS.inc(outcome="rate_limited")
+            rlog.event("rate_limited", files=len(media_msgs))
+            await message.reply("🐢 You are sending images too fast. Please wait a moment and try again.")
+            return
+    if job_queue:
+        await submit_remote(message, media_msgs, rlog)
+        return
+
+    status = StatusMessage(outbound, message).start(f"📥 Downloading {len(media_msgs)} file(s)...")
+    try:
+        medias = [get_media(m) for m in media_msgs]
+        with metrics.timed("download"):
+            files = await asyncio.gather(*(media_io.download(m, media) for m, media in zip(media_msgs, medias)))
+        try:
+            # One entry per page; documents are rendered page by page inside the workers
+            docs = [(file.source, document_kind(getattr(media, "mime_type", None))) for file, media in zip(files, medias)]
+            if any(kind == "pdf" for _, kind in docs):
+                # Counting PDF pages needs pypdfium2, which only the workers load
+                try:
+                    async with scheduler.slot(user_id, message.chat.id, priority=user_id in ADMIN_IDS):
+                        pages, skipped = await ocr_pool.run(plan_pages, docs)
+                except QueueFull:
+                    await status.finish("🚦 The bot is overloaded right now. Please try again in a minute.")
+                    return
+                except Exception as e:
+                    logging.warning("Counting document pages failed: %r", e)
+                    # One page each; ocr_page reports the error for a broken document
+                    pages, skipped = [(i, kind, 0) for i, (_, kind) in enumerate(docs)], 0
+            else:
+                pages, skipped = await asyncio.to_thread(plan_pages, docs)
+
+            done = 0
+            # Feed the scheduler only as many pages as this user may run at once,
+            # so a long document neither fills the shared queue nor gets rejected
+            feed = asyncio.Semaphore(scheduler.user_max_concurrent)
+
+            async def ocr_one(i, kind, index):
+                nonlocal done
+                file, media = files[i], medias[i]
+                unique_id = f"{media.file_unique_id}:{index}" if kind else media.file_unique_id
+                key = file_key(unique_id, lang, PIPELINE_VERSION, spell)
+                text = await asyncio.to_thread(result_cache.get, key)
+                used_lang = None
+                if text is None:
+                    async with feed:
+                        result = await ocr_with_pool(file, lang, hint, spell, None, user_id, message.chat.id,
+                                                     priority=user_id in ADMIN_IDS, page=(kind, index) if kind else None)
+                    text, used_lang = result or ("OCR error: the bot is overloaded, please try again later", lang)
+                    if not text.startswith("OCR error"):
+                        await asyncio.to_thread(result_cache.put, [key], text)
+                done += 1
+                if done < len(pages):
+                    status.update(f"🔍 Running OCR: {done}/{len(pages)} pages done...")
+                return text, used_lang
+
+            status.update(f"🔍 Running OCR on {len(pages)} page(s)...")
+            rlog.event("batch_start", files=len(files), pages=len(pages), skipped=skipped)
+            started = time.monotonic()
+            results = await asyncio.gather(*(ocr_one(*page) for page in pages))
+            errors = sum(text.startswith("OCR error") for text, _ in results)
+            rlog.event("batch_done", pages=len(pages), errors=errors, seconds=f"{time.monotonic() - started:.2f}")
+        finally:
+            for file in files:
+                file.discard()
+
+        if not lang:
+            detected = next((used for text, used in results if used and not text.startswith("OCR error")), None)
+            if detected:
+                store.set_detected_lang(user_id, detected)
+        text = join_pages([text for text, _ in results], skipped)
+        metrics.REQUESTS.inc(outcome="error" if errors == len(results) else "ok")
+        # No AI button: the Gemini flow works on a single image
+        with metrics.timed("send"):
+            await send_result(message, text, ai=False, status=status)
+        store.incr("total")
+    finally:
+        await status.close()
+
+# Distributed mode: hand the job to the worker fleet; deliver_remote_results replies
+async def submit_remote(message: Message, media_msgs, rlog):
+    user_id = message.from_user.id
+    # Queued for the fleet: worth a status message right away
+    status = await outbound.call(message.chat.id, message.reply, "⏳ Queued for OCR...", reply_to_message_id=message.id)
+    items = []
+    for m in media_msgs:
+        media = get_media(m)
+        items.append({
+            "file_id": media.file_id,
+            "file_unique_id": media.file_unique_id,
+            "file_size": media.file_size or 0,
+            "kind": document_kind(getattr(media, "mime_type", None)),
+        })
+    payload = {
+        "items": items,
+        "lang": store.get_lang(user_id),
+        "hint": store.get_detected_lang(user_id),
+        "spell": store.get_spell(message.chat.id),
+        "user_id": user_id,
+        "chat_id": message.chat.id,
+        "message_id": message.id,
+        "status_id": status.id,
+    }
+    job_id = await asyncio.to_thread(job_queue.enqueue, payload)
+    remote_jobs[job_id] = (message, status, rlog)
+    rlog.event("enqueued", job=job_id, files=len(items))
+
+async def deliver_remote_result(job_id, state, payload, result, error):
+    message, status, rlog = remote_jobs.pop(job_id, (None, None, None))
+    if message is None:
+        # Enqueued before a restart: fetch what we need to reply
+        message = await app.get_messages(payload["chat_id"], payload["message_id"])
+        status = await app.get_messages(payload["chat_id"], payload["status_id"])
+        rlog = reqlog.for_message(message)
+    # The queued message becomes the result
+    status = StatusMessage(outbound, message, shown=status)
+    if state == "dead":
+        metrics.REQUESTS.inc(outcome="error")
+        rlog.event("dead_letter", level=logging.WARNING, job=job_id, error=error)
+        await status.finish("❌ OCR failed after several attempts. Please try again later.")
+        return
+    texts, langs = result["texts"], result["langs"]
+    ok = [not text.startswith("OCR error") for text in texts]
+    lang, spell, user_id = payload["lang"], payload["spell"], payload["user_id"]
+    if not lang:
+        detected = next((used for used, good in zip(langs, ok) if used and good), None)
+        if detected:
+            store.set_detected_lang(user_id, detected)
+    item = payload["items"][0]
+    single_image = len(payload["items"]) == 1 and not item["kind"]
+    if single_image and ok[0]:
+        key = file_key(item["file_unique_id"], lang, PIPELINE_VERSION, spell)
+        await asyncio.to_thread(result_cache.put, [key], texts[0])
+    metrics.REQUESTS.inc(outcome="ok" if any(ok) else "error")
+    rlog.event("remote_done", job=job_id, pages=len(texts), errors=ok.count(False))
+    text = join_pages(texts, result["skipped"])
+    with metrics.timed("send"):
+        await send_result(message, text, ai=single_image, status=status)
+    if single_image:
+        # The AI button re-downloads by file_id when pressed
+        await asyncio.to_thread(artifacts.put, (message.chat.id, message.id), item["file_id"], item["file_size"], text)
+    store.incr("total")
+
+async def deliver_remote_results():
+    while True:
+        await asyncio.sleep(JOBQUEUE_POLL_INTERVAL)
+        try:
+            finished = await asyncio.to_thread(job_queue.finished)
+        except Exception as e:
+            logging.warning("job queue poll failed: %s", e)
+            continue
+        for job in finished:
+            try:
+                await deliver_remote_result(*job)
+            except Exception as e:
+                # Acknowledged anyway: a reply that cannot be sent now will not work later either
+                logging.warning("delivering job %s failed: %s", job[0], e)
+        await asyncio.to_thread(job_queue.mark_delivered, [job[0] for job in finished])
+
+# Replies with the OCR text and feedback buttons; long results go out as a .txt file
+# reprocess: the text is from a similar earlier image, offer a fresh OCR
+# status: the request's StatusMessage, if any; a visible one becomes the result
+async def send_result(message: Message, text, ai=True, reprocess=False, status=None):
+    buttons = [InlineKeyboardButton(random.choice(SATISFIED_ALTS), callback_data=f"satisfies|{message.chat.id}|{message.id}")]
+    if ai:
+        buttons.append(InlineKeyboardButton(random.choice(USE_AI_ALTS), callback_data=f"useai|{message.chat.id}|{message.id}"))
+    rows = [buttons]
+    note = "<i>⚠️ This is auto-detected text. OCR may make mistakes.</i>"
+    if reprocess:
+        rows.append([InlineKeyboardButton("🔁 Reprocess", callback_data=f"reprocess|{message.chat.id}|{message.id}")])
+        note = "<i>♻️ This image looks like one read before, so the earlier text is shown. Tap Reprocess if it does not match.</i>"
+    keyboard = InlineKeyboardMarkup(rows)
+    status = status or StatusMessage(outbound, message)
+    if len(text) > MAX_MESSAGE_TEXT:
+        # A text message cannot be edited into a document
+        await status.delete()
+        await outbound.call(
+            message.chat.id, message.reply_document,
+            io.BytesIO(text.encode("utf-8")),
+            file_name="ocr_result.txt",
+            caption=f"<b>📝 Extracted Text</b> is too long for a message, so here it is as a file.\n{note}",
+            reply_to_message_id=message.id,
+            parse_mode=ParseMode.HTML,
+            reply_markup=keyboard,
+        )
+        return
+    reply_text = (
+        "<b>📝 Extracted Text:</b>\n\n"
+        f"<pre>{escape(text)}</pre>\n"
+        f"{note}"
+    )
+    await status.finish(reply_text, ParseMode.HTML, keyboard)
+
+# Runs OCR in the worker pool; returns (text, lang used) or None if the job was rejected.
+# status is optional; page=(kind, index) OCRs one page of a PDF/TIFF. With a
+# status message, large single images show their text there as it is recognized.
+async def ocr_with_pool(image, lang, hint, spell, status, user_id, chat_id, priority=False, page=None):
+    async def on_queued(waiting):
+        if not scheduler.ready:
+            status.show("⏳ The bot is starting up. OCR will begin in a few seconds...")
+        else:
+            status.show(f"⏳ All workers are busy ({waiting} in queue). OCR will start shortly...")
+
+    notify = status is not None
+    # Every pool job (tiles and blocks are several) gets its slot from the
+    # scheduler, which hands them out fairly across chats and users
+    async def run(fn, *args, **kwargs):
+        nonlocal notify
+        first, notify = notify, False
+        async with scheduler.slot(user_id, chat_id, priority=priority, on_queued=on_queued if first else None):
+            if first:
+                status.update(f"🔍 Running OCR (lang: {lang or 'auto-detect'})...")
+            return await ocr_pool.run(fn, *args, **kwargs)
+
+    async def show_progress(text, done, total):
+        # Coalesced by the status: only the newest preview is sent, and only
+        # once the job is slow enough to have a status message
+        preview = text if len(text) <= MAX_MESSAGE_TEXT else text[:MAX_MESSAGE_TEXT] + "…"
+        status.update(
+            f"<b>📝 Extracted so far ({done}/{total}):</b>\n\n<pre>{escape(preview)}</pre>\n<i>⏳ Still reading...</i>",
+            ParseMode.HTML,
+        )
+
+    options = dict(lang=lang, hint=hint, spell=spell, timeout=OCR_JOB_TIMEOUT)
+    progress = show_progress if status else None
+    try:
+        if page:
+            return await run(ocr_page, image.source, *page, **options)
+        if TILE_MIN_HEIGHT and await asyncio.to_thread(needs_tiling, image.source):
+            return await ocr_tiled(run, image.source, on_progress=progress, **options)
+        if status and await asyncio.to_thread(worth_splitting, image.source):
+            return await ocr_progressive(run, image.source, on_progress=progress, **options)
+        return await run(ocr_image, image.source, **options)
+    except QueueFull:
+        if status:
+            await status.finish("🚦 The bot is overloaded right now. Please try again in a minute.")
+        return None
+    except asyncio.TimeoutError:
+        return "OCR error: timed out", lang
+    except Exception as e:
+        return f"OCR error: {str(e)}", lang
+
+# OCR handler with inline buttons
+@app.on_message((filters.command("ocr") & (filters.group | filters.private)))
+async def handle_ocr(client, message: Message):
+    media_msg = None
+    # Check if the command message itself has media
+    if is_ocr_media(message):
+        media_msg = message
+    # If not, check if it's a reply to a media message
+    elif message.reply_to_message and is_ocr_media(message.reply_to_message):
+        media_msg = message.reply_to_message
+
+    if not media_msg:
+        await message.reply("⚠️ Please send or reply to an image, PDF or TIFF (photo/document/sticker).")
+        return
+
+    rlog = reqlog.for_message(message)
+    rlog.event("ocr_command", media_msg=media_msg.id, media=media_type(media_msg), album=media_msg.media_group_id)
+
+    if media_msg.media_group_id:
+        if media_msg is message and message.chat.type == ChatType.PRIVATE:
+            # The other album parts arrive through handle_private_media_ocr
+            albums.add(message)
+            return
+        album = await client.get_media_group(media_msg.chat.id, media_msg.id)
+        await run_batch_ocr(message, [m for m in album if is_ocr_media(m)], rlog)
+        return
+    await run_ocr(message, media_msg, rlog)
+
+# OCR handler for direct media in private chats
+@app.on_message(filters.private & (filters.photo | filters.document | filters.sticker))
+async def handle_private_media_ocr(client, message: Message):
+    media_msg = message
+    # Only process documents if they are images, PDFs or TIFFs
+    if not is_ocr_media(media_msg):
+        return
+    if media_msg.media_group_id:
+        albums.add(media_msg)
+        return
+    rlog = reqlog.for_message(message)
+    rlog.event("private_media", media=media_type(media_msg))
+    await run_ocr(message, media_msg, rlog)
+
+# Callback handler for inline buttons
+@app.on_callback_query()
+async def handle_callback(client, callback_query: CallbackQuery):
+    data = callback_query.data
+    parts = data.split("|")
+    action = parts[0]
+    chat_id = int(parts[1])
+    msg_id = int(parts[2])
+    cache_key = (chat_id, msg_id)
+    if action == "reprocess":
+        # Re-read the original message: it may be the image or a reply to it
+        await callback_query.answer("Running OCR again...")
+        await callback_query.message.edit_reply_markup(None)
+        original = await client.get_messages(chat_id, msg_id)
+        media_msg = original if original and is_ocr_media(original) else getattr(original, "reply_to_message", None)
+        if not original or original.empty or not media_msg or not is_ocr_media(media_msg):
+            await callback_query.message.reply("Image expired or not found. Please resend.")
+            return
+        await asyncio.to_thread(artifacts.delete, cache_key)
+        await run_ocr(original, media_msg, reprocess=True)
+    elif action == "satisfies":
+        store.incr("satisfied")
+        await callback_query.answer("Thank you for your feedback!", show_alert=True)
+        await callback_query.message.edit_reply_markup(None)
+        # Delete file immediately
+        await asyncio.to_thread(artifacts.delete, cache_key)
+    elif action == "useai":
+        user_id = callback_query.from_user.id
+        is_admin = user_id in ADMIN_IDS
+        quota_left = get_ai_quota_left(user_id)
+        if not is_admin and quota_left <= 0:
+            await callback_query.answer("AI quota exceeded. Please try again later.", show_alert=True)
+            return
+        store.incr("ai_used")
+        await callback_query.answer("Processing with Gemini AI...", show_alert=True)
+        await callback_query.message.edit_reply_markup(None)
+        artifact = await asyncio.to_thread(artifacts.get, cache_key)
+        if not artifact:
+            await callback_query.message.reply("Image expired or not found. Please resend.")
+            return
+        # Delete the original OCR-only message
+        try:
+            await callback_query.message.delete()
+        except Exception:
+            pass
+        # Show loading message
+        loading_msg = await client.send_message(
+            chat_id=callback_query.message.chat.id,
+            text="<i>Processing with Gemini AI...</i>",
+            parse_mode=ParseMode.HTML
+        )
+        try:
+            # Cached OCR results never downloaded the image, fetch it now
+            source = artifact.source
+            if source is None:
+                image = await media_io.download_file_id(client, artifact.file_id, artifact.file_size)
+                source = await asyncio.to_thread(image.read)
+                await asyncio.to_thread(artifacts.set_image, cache_key, image)
+            gemini_text = await ai_client.ocr(source)
+        except Exception as e:
+            await loading_msg.edit(f"<b>Gemini AI error:</b> {e}")
+            return
+        if not gemini_text.strip():
+            gemini_text = "No text found."
+        # Show both results in two boxes
+        MAX_BOX_LEN = 1800
+        ocr_text = artifact.text
+        if len(ocr_text) > MAX_BOX_LEN:
+            ocr_text = ocr_text[:MAX_BOX_LEN] + "\n...truncated"
+        if len(gemini_text) > MAX_BOX_LEN:
+            gemini_text = gemini_text[:MAX_BOX_LEN] + "\n...truncated"
+        ocr_box = f"<b>📝 Extracted Text:</b>\n<pre>{escape(ocr_text)}</pre>"
+        gemini_box = f"<b>🤖 Gemini AI Processed Text:</b>\n<pre>{escape(gemini_text)}</pre>"
+        if is_admin:
+            quota_display = "∞"
+        else:
+            quota_left -= 1
+            store.use_ai_quota(user_id)
+            quota_display = str(quota_left)
+        await loading_msg.edit(
+            f"{ocr_box}\n\n{gemini_box}\n\n<i>⚠️ This is auto-detected text. OCR may make mistakes.</i>\n"
+            f"<b>AI requests left today:</b> {quota_display}"
+        )
+        # Keep file until satisfied or timeout
+
+@app.on_message(filters.command("lang"))
+async def set_lang(_, message):
+    if len(message.command) < 2:
+        await message.reply("Usage: /lang eng, /lang hin, or /lang eng+hin")
+        return
+    lang = message.text.split(" ", 1)[1].strip()
+    store.set_lang(message.from_user.id, lang)
+    await message.reply(f"OCR language set to: {lang}")
+
+@app.on_message(filters.command("spell"))
+async def set_spell(client, message):
+    if len(message.command) < 2 or message.command[1].lower() not in ("on", "off"):
+        state = "on" if store.get_spell(message.chat.id) else "off"
+        await message.reply(f"Spell correction is {state} for this chat.\nUsage: /spell on or /spell off")
+        return
+    # In groups only chat admins (or bot admins) may change it
+    if message.chat.type in (ChatType.GROUP, ChatType.SUPERGROUP) and message.from_user.id not in ADMIN_IDS:
+        member = await client.get_chat_member(message.chat.id, message.from_user.id)
+        if member.status not in (ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER):
+            await message.reply("❌ Only group admins can change spell correction.")
+            return
+    enabled = message.command[1].lower() == "on"
+    store.set_spell(message.chat.id, enabled)
+    await message.reply(f"Spell correction turned {'on' if enabled else 'off'} for this chat.")
+
+@app.on_message(filters.command("langlist"))
+async def langlist(_, message):
+    langs = ', '.join(SUPPORTED_LANGS)
+    await message.reply(f"Supported OCR languages:\n{langs}")
+
+@app.on_message(filters.command("db"))
+async def send_db(client, message):
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    # Export in the old users.txt format
+    export_path = "users_export.txt"
+    count = await asyncio.to_thread(store.export_users, export_path)
+    if count:
+        await client.send_document(
+            chat_id=message.chat.id,
+            document=export_path,
+            caption=f"User database, {count} users (admin only)"
+        )
+    else:
+        await message.reply("No user database found.")
+    os.remove(export_path)
+
+# Update /stats to show satisfaction and AI usage rates
+@app.on_message(filters.command("stats"))
+async def stats(_, message):
+    total = store.get_counter("total")
+    satisfied = store.get_counter("satisfied")
+    ai_used = store.get_counter("ai_used")
+    satisfied_pct = (satisfied / total * 100) if total else 0
+    ai_used_pct = (ai_used / total * 100) if total else 0
+    cache = result_cache.stats()
+    hits = cache["memory_hits"] + cache["disk_hits"]
+    hit_pct = (hits / cache["lookups"] * 100) if cache["lookups"] else 0
+    queue = scheduler.stats()
+    await message.reply(
+        f"<b>Bot Usage Stats:</b>\n"
+        f"Total OCR requests: <b>{total}</b>\n"
+        f"Satisfied: <b>{satisfied}</b> ({satisfied_pct:.1f}%)\n"
+        f"Used AI: <b>{ai_used}</b> ({ai_used_pct:.1f}%)\n"
+        f"Cache hits: <b>{hits}</b> ({hit_pct:.1f}%, memory {cache['memory_hits']} / disk {cache['disk_hits']}), "
+        f"misses: <b>{cache['misses']}</b>\n"
+        f"OCR queue: <b>{queue['running']}</b> running, <b>{queue['waiting']}</b> waiting "
+        f"(priority {queue['waiting_priority']}), wait p50 {queue['wait_p50']:.1f}s / p95 {queue['wait_p95']:.1f}s\n"
+        f"Rejected: <b>{queue['rejected']}</b> (queue full), <b>{queue['rate_limited']}</b> (rate limited)\n",
+        parse_mode=ParseMode.HTML
+    )
+
+@app.on_message(filters.command("broadcast"))
+async def broadcast(_, message):
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    if len(message.command) < 2:
+        await message.reply("Usage: /broadcast <message>")
+        return
+    text = message.text.split(" ", 1)[1]
+    # Runs in the background; progress is reported in this chat
+    job_id = await broadcaster.start(text, message.chat.id)
+    if job_id is None:
+        await message.reply("No users to broadcast to.")
+
+@app.on_message(filters.command("help"))
+async def help(_, message):
+    await message.reply(
+        "<b>How to use the OCR Bot:</b>\n\n"
+        "1. <b>Send an image</b> — I’ll extract the text and reply.\n"
+        "   Albums and multi-page PDFs/TIFFs are read as one job; long results come back as a .txt file.\n"
+        "2. <b>Change OCR language</b> — Use <code>/lang &lt;lang&gt;</code> (e.g., <code>/lang eng</code>, <code>/lang hin</code>, <code>/lang eng+hin</code>).\n"
+        "3. <b>See supported languages</b> — Use <code>/langlist</code>.\n\n"
+        "<b>Commands:</b>\n"
+        "<code>/ocr</code> - Extract text from image (just send an image)\n"
+        "<code>/lang &lt;lang&gt;</code> - Set OCR language (e.g., eng, hin, eng+hin)\n"
+        "<code>/langlist</code> - List supported OCR languages\n"
+        "<code>/spell on|off</code> - Turn spell correction on or off for this chat\n"
+        "<code>/help</code> - How to use the bot\n"
+        "<i>⚠️ This is auto-detected text. OCR may make mistakes.</i>"
+        , parse_mode=ParseMode.HTML
+    )
+
+@app.on_message(filters.command("ping"))
+async def ping_handler(client, message: Message):
+    start = time.time()
+    sent = await message.reply("Pinging...")
+    latency = (time.time() - start) * 1000
+    uptime = str(datetime.timedelta(seconds=int(time.time() - BOT_START_TIME)))
+    await sent.edit(f"🏓 Pong!\n<b>Latency:</b> <code>{latency:.0f} ms</code>\n<b>Uptime:</b> <code>{uptime}</code>", parse_mode=ParseMode.HTML)
+
+@app.on_message(filters.command("sysd"))
+async def sysd_handler(client, message: Message):
+    if message.from_user.id not in ADMIN_IDS:
+        await message.reply("❌ You are not authorized to use this command.")
+        return
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            "neofetch", "--stdout",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await proc.communicate()
+        if proc.returncode != 0:
+            await message.reply(f"❌ neofetch error:\n<code>{stderr.decode().strip()}</code>", parse_mode=ParseMode.HTML)
+            return
+        output = stdout.decode().strip()
+        if len(output) > 4000:
+            output = output[:4000] + "\n...truncated"
+        await message.reply(f"<b>System Info:</b>\n<pre>{escape(output)}</pre>", parse_mode=ParseMode.HTML)
+    except Exception as e:
+        await message.reply(f"❌ Error running neofetch:\n<code>{e}</code>", parse_mode=ParseMode.HTML)
+
+async def warm_up_workers():
+    # Only OCR jobs wait for this (the scheduler holds them); commands and
+    # cached results are answered as soon as Telegram is connected
+    try:
+        with startup.timer.phase("warm_up"):
+            await asyncio.wait_for(ocr_pool.warm_up(), WARMUP_TIMEOUT)
+    except Exception as e:
+        logging.warning("OCR worker warm-up did not finish, serving anyway: %r", e)
+    finally:
+        scheduler.set_ready()
+
+async def main():
+    global bot_ready
+    media_io.init_temp_dir("bot")
+    # Up before Telegram so /healthz answers while the bot connects
+    metrics_server = None
+    if METRICS_PORT:
+        metrics_server = await metrics.start_server(lambda: bot_ready and app.is_connected and scheduler.ready)
+    # Workers load their models while we connect; in distributed mode OCR runs in worker.py
+    warming = asyncio.create_task(warm_up_workers()) if not job_queue else None
+    if job_queue:
+        scheduler.set_ready()
+    if near_dups:
+        # Near-duplicate lookups miss until the index is loaded
+        asyncio.create_task(asyncio.to_thread(near_dups.load))
+    with startup.timer.phase("telegram"):
+        await app.start()
+    store.start()
+    await broadcaster.resume()
+    delivery = asyncio.create_task(deliver_remote_results()) if job_queue else None
+    cleanup = asyncio.create_task(cleanup_artifacts())
+    bot_ready = True
+    try:
+        if warming:
+            await warming
+        startup.timer.done()
+        await idle()
+    finally:
+        bot_ready = False
+        if warming:
+            warming.cancel()
+        if delivery:
+            delivery.cancel()
+        cleanup.cancel()
+        if metrics_server:
+            await metrics_server.cleanup()
+        await broadcaster.close()
+        await app.stop()
+        await store.close()
+        result_cache.close()
+        if near_dups:
+            near_dups.close()
+        artifacts.close()
+        await ai_client.close()
+        ocr_pool.shutdown()
+        if job_queue:
+            job_queue.close()
+
+def run():
+    app.run(main()) 
\ No newline at end of file
@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+
+from pyrogram.errors import (
+    FloodWait, UserIsBlocked, InputUserDeactivated, UserDeactivated, UserDeactivatedBan, UserIsBot,
+)
+
+from config import STORAGE_PATH, BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_PROGRESS_INTERVAL
+from ratelimit import TokenBucket
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    text TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    progress_msg_id INTEGER,
+    status TEXT NOT NULL DEFAULT 'running',
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS broadcast_targets (
+    broadcast_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    PRIMARY KEY (broadcast_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS broadcast_targets_state ON broadcast_targets(broadcast_id, state);
+"""
+
+# Recipients that will never receive anything again. Not PeerIdInvalid: a
+# fresh session file lacks most peers, those users are only a failed send
+GONE_ERRORS = (UserIsBlocked, InputUserDeactivated, UserDeactivated, UserDeactivatedBan, UserIsBot)
+
+CHECKPOINT_INTERVAL = 1.0  # seconds between target state flushes
+
+
+class Broadcaster:
+    """Sends a message to every known user with bounded concurrency, at
+    most ``rate`` per second and within the bot's shared outbound limit
+    (``limiter``, a status.OutboundLimiter), so replies and a running
+    broadcast together stay under Telegram's global limit. Per-user progress
+    is checkpointed to SQLite, so a broadcast interrupted by a restart
+    resumes where it stopped."""
+
+    def __init__(self, app, store, limiter, path=STORAGE_PATH, rate=BROADCAST_RATE,
+                 concurrency=BROADCAST_CONCURRENCY, progress_interval=BROADCAST_PROGRESS_INTERVAL):
+        self.app = app
+        self.store = store
+        self.limiter = limiter
+        self.concurrency = concurrency
+        self.progress_interval = progress_interval
+        self._bucket = TokenBucket(rate)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+        self._db_lock = threading.Lock()
+        self._tasks = {}
+        self._paused_until = 0.0
+
+    # --- persistence (run in threads) ---
+
+    def _create(self, text, chat_id, user_ids):
+        with self._db_lock, self._db:
+            cur = self._db.execute(
+                "INSERT INTO broadcasts (text, chat_id, created) VALUES (?, ?, ?)", (text, chat_id, time.time())
+            )
+            job_id = cur.lastrowid
+            self._db.executemany(
+                "INSERT OR IGNORE INTO broadcast_targets (broadcast_id, user_id) VALUES (?, ?)",
+                ((job_id, uid) for uid in user_ids),
+            )
+        return job_id
+
+    def _load(self, job_id):
+        with self._db_lock:
+            return self._load_locked(job_id)
+
+    def _load_locked(self, job_id):
+        text, chat_id, msg_id = self._db.execute(
+            "SELECT text, chat_id, progress_msg_id FROM broadcasts WHERE id = ?", (job_id,)
+        ).fetchone()
+        pending = [row[0] for row in self._db.execute(
+            "SELECT user_id FROM broadcast_targets WHERE broadcast_id = ? AND state = 'pending'", (job_id,)
+        )]
+        counts = dict(self._db.execute(
+            "SELECT state, COUNT(*) FROM broadcast_targets WHERE broadcast_id = ? GROUP BY state", (job_id,)
+        ))
+        return text, chat_id, msg_id, pending, counts
+
+    def _checkpoint(self, job_id, states, status=None):
+        with self._db_lock, self._db:
+            self._db.executemany(
+                "UPDATE broadcast_targets SET state = ? WHERE broadcast_id = ? AND user_id = ?",
+                [(state, job_id, uid) for uid, state in states.items()],
+            )
+            if status:
+                self._db.execute("UPDATE broadcasts SET status = ? WHERE id = ?", (status, job_id))
+
+    def _set_progress_msg(self, job_id, msg_id):
+        with self._db_lock, self._db:
+            self._db.execute("UPDATE broadcasts SET progress_msg_id = ? WHERE id = ?", (msg_id, job_id))
+
+    def _running_jobs(self):
+        with self._db_lock:
+            return [row[0] for row in self._db.execute("SELECT id FROM broadcasts WHERE status = 'running'")]
+
+    # --- public API ---
+
+    async def start(self, text, chat_id):
+        user_ids = await asyncio.to_thread(self.store.iter_user_ids)
+        if not user_ids:
+            return None
+        job_id = await asyncio.to_thread(self._create, text, chat_id, user_ids)
+        self._tasks[job_id] = asyncio.create_task(self._run(job_id))
+        return job_id
+
+    async def resume(self):
+        # Called once at startup for broadcasts cut short by a restart
+        for job_id in await asyncio.to_thread(self._running_jobs):
+            if job_id not in self._tasks:
+                log.info("resuming broadcast #%s", job_id)
+                self._tasks[job_id] = asyncio.create_task(self._run(job_id))
+
+    # --- sending ---
+
+    async def _send(self, uid, text):
+        while True:
+            wait = self._paused_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await self._bucket.acquire()
+            await self.limiter.acquire()
+            try:
+                await self.app.send_message(uid, text)
+                return "sent"
+            except FloodWait as e:
+                # Telegram tells us exactly how long to back off; pause every worker
+                self._paused_until = max(self._paused_until, time.monotonic() + e.value + 1)
+                log.warning("broadcast FloodWait %ss", e.value)
+            except GONE_ERRORS:
+                return "pruned"
+            except Exception as e:
+                log.info("broadcast to %s failed: %s", uid, e)
+                return "failed"
+
+    async def _run(self, job_id):
+        text, chat_id, msg_id, pending, counts = await asyncio.to_thread(self._load, job_id)
+        stats = {"sent": counts.get("sent", 0), "failed": counts.get("failed", 0), "pruned": counts.get("pruned", 0)}
+        states = {}
+        queue = asyncio.Queue()
+        for uid in pending:
+            queue.put_nowait(uid)
+        started = time.monotonic()
+        done_this_run = 0
+
+        progress = None
+        if msg_id:
+            try:
+                progress = await self.app.get_messages(chat_id, msg_id)
+            except Exception:
+                progress = None
+        if progress is None or progress.empty:
+            try:
+                progress = await self.limiter.call(chat_id, self.app.send_message, chat_id,
+                                                   f"📣 Broadcast #{job_id} starting...")
+                await asyncio.to_thread(self._set_progress_msg, job_id, progress.id)
+            except Exception as e:
+                # The broadcast itself does not depend on it
+                log.warning("broadcast #%s: cannot send progress message: %s", job_id, e)
+                progress = None
+
+        def render(finished=False):
+            elapsed = max(time.monotonic() - started, 1e-6)
+            head = f"✅ Broadcast #{job_id} finished" if finished else f"📣 Broadcast #{job_id} in progress"
+            return (
+                f"{head}\n"
+                f"Sent: {stats['sent']} | Failed: {stats['failed']} | Removed: {stats['pruned']}\n"
+                f"Remaining: {len(pending) - done_this_run}\n"
+                f"Speed: {done_this_run / elapsed:.1f} msg/s"
+            )
+
+        async def worker():
+            nonlocal done_this_run
+            while True:
+                uid = await queue.get()
+                try:
+                    state = await self._send(uid, text)
+                    states[uid] = state
+                    stats[state] += 1
+                    done_this_run += 1
+                finally:
+                    queue.task_done()
+
+        async def checkpointer():
+            last_edit = 0.0
+            while True:
+                await asyncio.sleep(CHECKPOINT_INTERVAL)
+                await self._flush(job_id, states)
+                if progress and time.monotonic() - last_edit >= self.progress_interval:
+                    last_edit = time.monotonic()
+                    try:
+                        await self.limiter.call(chat_id, progress.edit, render(), wait=False)
+                    except Exception:
+                        pass
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        ticker = asyncio.create_task(checkpointer())
+        try:
+            await queue.join()
+        finally:
+            for task in workers + [ticker]:
+                task.cancel()
+            # Also when cancelled by close(): users sent to since the last
+            # checkpoint would get the message again on resume
+            await self._flush(job_id, states)
+        await self._flush(job_id, states, status="done")
+        self._tasks.pop(job_id, None)
+        if progress:
+            try:
+                await self.limiter.call(chat_id, progress.edit, render(finished=True))
+            except Exception:
+                pass
+
+    async def _flush(self, job_id, states, status=None):
+        batch = dict(states)
+        states.clear()
+        pruned = [uid for uid, state in batch.items() if state == "pruned"]
+        if pruned:
+            self.store.prune_users(pruned)
+        await asyncio.to_thread(self._checkpoint, job_id, batch, status)
+
+    async def close(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        # Their last checkpoint needs the database
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        with self._db_lock:
+            self._db.close()
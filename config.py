@@ -1,7 +1,117 @@
 import os
 
-API_ID = int(os.getenv("API_ID"))
+API_ID = int(os.getenv("API_ID", "0"))
 API_HASH = os.getenv("API_HASH")
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-ADMIN_IDS = [int(uid.strip()) for uid in os.getenv("ADMIN_IDS", "").split(",") if uid.strip()] 
\ No newline at end of file
+ADMIN_IDS = [int(uid.strip()) for uid in os.getenv("ADMIN_IDS", "").split(",") if uid.strip()]
+
+# OCR process pool
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", os.cpu_count() or 1))
+OCR_QUEUE_SIZE = int(os.getenv("OCR_QUEUE_SIZE", "50"))  # jobs allowed to wait for a worker
+OCR_JOB_TIMEOUT = int(os.getenv("OCR_JOB_TIMEOUT", "60"))  # seconds
+OCR_MAX_JOBS_PER_WORKER = int(os.getenv("OCR_MAX_JOBS_PER_WORKER", "100"))  # recycle workers after N jobs
+# Language models every worker loads before serving; jobs wait until all workers are warm
+WARMUP_LANGS = [l.strip() for l in os.getenv("WARMUP_LANGS", "eng").split(",") if l.strip()]
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "120"))  # serve anyway after this many seconds
+
+# local: OCR runs in this process's pool. distributed: jobs go to a durable
+# queue consumed by any number of `python worker.py` processes on this host
+OCR_MODE = os.getenv("OCR_MODE", "local")
+JOBQUEUE_PATH = os.getenv("JOBQUEUE_PATH", "jobs.db")  # local disk only: SQLite WAL does not work over NFS/SMB
+JOBQUEUE_LEASE = float(os.getenv("JOBQUEUE_LEASE", "120"))  # seconds a worker owns a job without a heartbeat
+JOBQUEUE_MAX_ATTEMPTS = int(os.getenv("JOBQUEUE_MAX_ATTEMPTS", "3"))  # then the job is dead-lettered
+JOBQUEUE_POLL_INTERVAL = float(os.getenv("JOBQUEUE_POLL_INTERVAL", "0.5"))
+
+# Fair scheduling of OCR jobs across chats and users
+SCHED_USER_MAX_CONCURRENT = int(os.getenv("SCHED_USER_MAX_CONCURRENT", "2"))  # jobs one user may run at once
+SCHED_USER_RATE_PER_MIN = float(os.getenv("SCHED_USER_RATE_PER_MIN", "10"))  # sustained OCR jobs per user
+SCHED_USER_BURST = int(os.getenv("SCHED_USER_BURST", "5"))
+SCHED_SMALL_IMAGE_BYTES = int(os.getenv("SCHED_SMALL_IMAGE_KB", "256")) * 1024  # priority lane at or below this
+
+# Tesseract backend: "auto" uses tesserocr when installed, else pytesseract
+OCR_ENGINE = os.getenv("OCR_ENGINE", "auto")
+OCR_ENGINE_MAX_HANDLES = int(os.getenv("OCR_ENGINE_MAX_HANDLES", "4"))  # per worker process
+
+# Image preprocessing profile: fast, balanced or quality (see preprocess.PROFILES)
+PREPROCESS_PROFILE = os.getenv("PREPROCESS_PROFILE", "balanced")
+
+# Spell correction; dictionaries other than English are downloaded on first use
+SPELLCHECK_LANGS = {l.strip() for l in os.getenv("SPELLCHECK_LANGS", "eng").split(",") if l.strip()}
+SPELLCHECK_CACHE_SIZE = int(os.getenv("SPELLCHECK_CACHE_SIZE", "50000"))  # memoized words per worker
+SPELLCHECK_SKIP_CONFIDENCE = float(os.getenv("SPELLCHECK_SKIP_CONFIDENCE", "90"))  # trust Tesseract above this
+
+# Downloads: small images stay in memory, larger ones spill to unique temp files
+MEDIA_INMEMORY_MAX_BYTES = int(os.getenv("MEDIA_INMEMORY_MAX_MB", "5")) * 1024 * 1024
+MEDIA_TEMP_DIR = os.getenv("MEDIA_TEMP_DIR", "tmp_media")
+
+# State behind the result buttons (Ask AI, Reprocess): text and file_id per
+# result in SQLite, images in memory and then on disk while they are kept
+ARTIFACT_PATH = os.getenv("ARTIFACT_PATH", "artifacts.db")
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "artifacts")
+ARTIFACT_MEMORY_ITEMS = int(os.getenv("ARTIFACT_MEMORY_ITEMS", "500"))
+ARTIFACT_MEMORY_MB = int(os.getenv("ARTIFACT_MEMORY_MB", "100"))
+ARTIFACT_DISK_MB = int(os.getenv("ARTIFACT_DISK_MB", "1024"))
+ARTIFACT_TTL_HOURS = float(os.getenv("ARTIFACT_TTL_HOURS", "168"))  # buttons work this long after last use
+ARTIFACT_IMAGE_TTL_MINUTES = float(os.getenv("ARTIFACT_IMAGE_TTL_MINUTES", "30"))  # then refetched by file_id
+ARTIFACT_CLEANUP_INTERVAL = float(os.getenv("ARTIFACT_CLEANUP_INTERVAL", "300"))  # seconds
+
+# Albums and multi-page documents
+ALBUM_WAIT = float(os.getenv("ALBUM_WAIT", "1.5"))  # seconds to wait for the rest of an album
+DOC_MAX_PAGES = int(os.getenv("DOC_MAX_PAGES", "30"))  # pages OCRed per PDF/TIFF/album
+PDF_RENDER_DPI = int(os.getenv("PDF_RENDER_DPI", "300"))
+
+# Very tall images (long screenshots, scans) are cut into bands OCRed in parallel
+TILE_MIN_HEIGHT = int(os.getenv("TILE_MIN_HEIGHT", "4000"))  # pixels; 0 disables tiling
+TILE_HEIGHT = int(os.getenv("TILE_HEIGHT", "1600"))
+TILE_OVERLAP = int(os.getenv("TILE_OVERLAP", "48"))  # rows shared by tiles cut through text
+
+# Progressive results: large images with several text blocks (scanned pages,
+# long documents) are recognized part by part and the reply shows the text
+# so far. Ordinary photos finish faster as a single job
+PROGRESSIVE_MIN_PIXELS = int(os.getenv("PROGRESSIVE_MIN_PIXELS", "3000000"))  # smaller images: one job; 0 disables
+PROGRESSIVE_MIN_BLOCKS = int(os.getenv("PROGRESSIVE_MIN_BLOCKS", "3"))  # fewer blocks: one pass, no previews
+
+# OCR result cache
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "ocr_cache.db")
+RESULT_CACHE_MEMORY_ITEMS = int(os.getenv("RESULT_CACHE_MEMORY_ITEMS", "1000"))
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "200"))
+RESULT_CACHE_MAX_AGE_DAYS = int(os.getenv("RESULT_CACHE_MAX_AGE_DAYS", "30"))
+
+# Near-duplicate images (re-compressed, resized, forwarded) reuse earlier results
+NEAR_DUP_PATH = os.getenv("NEAR_DUP_PATH", "near_dups.db")
+NEAR_DUP_MAX_ITEMS = int(os.getenv("NEAR_DUP_MAX_ITEMS", "200000"))  # 0 disables the index
+NEAR_DUP_MAX_DISTANCE = int(os.getenv("NEAR_DUP_MAX_DISTANCE", "16"))  # differing bits of the 256-bit hash
+
+# Bot state database
+STORAGE_PATH = os.getenv("STORAGE_PATH", "bot.db")
+STORAGE_FLUSH_INTERVAL = float(os.getenv("STORAGE_FLUSH_INTERVAL", "2"))  # seconds between batched writes
+
+# Gemini AI OCR client
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+GEMINI_BACKEND = os.getenv("GEMINI_BACKEND", "rest")  # rest (aiohttp) or sdk (google-generativeai)
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com")
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "15"))  # requests per minute allowed by the API quota
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "60"))  # seconds per call
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))  # on 429/5xx/timeouts
+GEMINI_MAX_SIDE = int(os.getenv("GEMINI_MAX_SIDE", "2048"))  # images are downscaled before upload
+
+# Status messages: short jobs only show "typing…"; a status message appears
+# when a job is slow or queued and is edited into the result
+STATUS_DELAY = float(os.getenv("STATUS_DELAY", "3"))  # seconds before a status message is sent
+STATUS_EDIT_INTERVAL = float(os.getenv("STATUS_EDIT_INTERVAL", "2"))  # min seconds between edits of one status
+# Outbound Bot API calls into chats (replies, edits, chat actions)
+OUTBOUND_RATE = float(os.getenv("OUTBOUND_RATE", "25"))  # per second over all chats, Telegram allows ~30
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))  # per second in one private chat
+OUTBOUND_GROUP_RATE = float(os.getenv("OUTBOUND_GROUP_RATE", "20"))  # per minute in one group
+
+# /broadcast
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "20"))  # messages per second, out of OUTBOUND_RATE
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "10"))
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "5"))  # seconds between progress edits
+
+# Metrics and probes (/metrics, /healthz, /readyz); port 0 disables the server
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "8080"))
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))  # share of requests logged at INFO
@@ -0,0 +1,79 @@
+from PIL import Image
+
+from config import PDF_RENDER_DPI, DOC_MAX_PAGES
+from media import source_to_file
+
+# Document mime types we rasterize page by page
+DOCUMENT_KINDS = {
+    "application/pdf": "pdf",
+    "image/tiff": "tiff",
+}
+
+
+def document_kind(mime_type):
+    # "pdf", "tiff" or None for plain images
+    return DOCUMENT_KINDS.get((mime_type or "").lower())
+
+
+def _open_pdf(source):
+    # pypdfium2 renders PDF pages; optional and imported on first use,
+    # without it only TIFFs are paged
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        raise RuntimeError("PDF support needs pypdfium2 (pip install pypdfium2)")
+    return pdfium.PdfDocument(source)
+
+
+def page_count(source, kind):
+    if kind == "pdf":
+        pdf = _open_pdf(source)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    with Image.open(source_to_file(source)) as img:
+        return getattr(img, "n_frames", 1)
+
+
+def render_page(source, kind, index, dpi=PDF_RENDER_DPI):
+    # Only the requested page is decoded, so each worker holds one raster at a time
+    if kind == "pdf":
+        pdf = _open_pdf(source)
+        try:
+            page = pdf[index]
+            try:
+                return page.render(scale=dpi / 72).to_pil()
+            finally:
+                page.close()
+        finally:
+            pdf.close()
+    with Image.open(source_to_file(source)) as img:
+        img.seek(index)
+        img.load()
+        return img.copy()
+
+
+def plan_pages(docs, max_pages=DOC_MAX_PAGES):
+    """docs: [(source, kind)]. Returns ([(doc index, kind, page index)], pages skipped)."""
+    pages = []
+    for i, (source, kind) in enumerate(docs):
+        count = 1
+        if kind:
+            try:
+                count = page_count(source, kind)
+            except Exception:
+                pass  # ocr_page reports the error for page 1
+        pages += [(i, kind, index) for index in range(count)]
+    return pages[:max_pages], max(0, len(pages) - max_pages)
+
+
+def join_pages(texts, skipped=0, max_pages=DOC_MAX_PAGES):
+    # One combined result in page order
+    if len(texts) == 1:
+        text = texts[0]
+    else:
+        text = "\n\n".join(f"--- Page {n} ---\n{t}" for n, t in enumerate(texts, 1))
+    if skipped:
+        text += f"\n\n... {skipped} more page(s) skipped (limit is {max_pages})"
+    return text
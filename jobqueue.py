@@ -0,0 +1,183 @@
+import json
+import sqlite3
+import threading
+import time
+
+from config import JOBQUEUE_PATH, JOBQUEUE_LEASE, JOBQUEUE_MAX_ATTEMPTS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',  -- pending, leased, done, dead
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_until REAL,
+    worker TEXT,
+    result TEXT,
+    error TEXT,
+    delivered INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs(state, available_at);
+CREATE INDEX IF NOT EXISTS jobs_undelivered ON jobs(delivered, state);
+"""
+
+
+class JobQueue:
+    """Durable OCR job queue in SQLite, shared by the bot and any number of
+    worker processes on the same host. WAL mode needs shared memory, which
+    network filesystems do not provide, so the file must be on local disk.
+
+    A worker leases a job for ``lease`` seconds and either completes it, fails
+    it (retried with backoff until max_attempts, then dead-lettered) or dies;
+    an expired lease puts the job back in play. The bot polls for done and
+    dead jobs, replies, and acknowledges them as delivered.
+    """
+
+    def __init__(self, path=JOBQUEUE_PATH, lease=JOBQUEUE_LEASE, max_attempts=JOBQUEUE_MAX_ATTEMPTS):
+        self.lease = lease
+        self.max_attempts = max_attempts
+        # isolation_level=None: transactions are explicit, BEGIN IMMEDIATE
+        # takes the write lock up front so two workers cannot lease one job
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def _write(self, fn):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(time.time())
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return result
+
+    # --- producer (bot) ---
+
+    def enqueue(self, payload):
+        def op(now):
+            return self._db.execute(
+                "INSERT INTO jobs (payload, max_attempts, available_at, created, updated) VALUES (?, ?, ?, ?, ?)",
+                (json.dumps(payload), self.max_attempts, now, now, now),
+            ).lastrowid
+        return self._write(op)
+
+    def finished(self, limit=50):
+        # Done and dead jobs the bot has not replied to yet
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, state, payload, result, error FROM jobs "
+                "WHERE delivered = 0 AND state IN ('done', 'dead') ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+        return [(job_id, state, json.loads(payload), json.loads(result) if result else None, error)
+                for job_id, state, payload, result, error in rows]
+
+    def mark_delivered(self, job_ids):
+        if not job_ids:
+            return
+
+        def op(now):
+            self._db.executemany("UPDATE jobs SET delivered = 1, updated = ? WHERE id = ?",
+                                 [(now, job_id) for job_id in job_ids])
+        self._write(op)
+
+    # --- consumer (worker) ---
+
+    def lease_job(self, worker):
+        """Returns (job_id, payload, attempt) or None when nothing is ready."""
+        def op(now):
+            # Leases that ran out on their last attempt go to the dead letters
+            self._db.execute(
+                "UPDATE jobs SET state = 'dead', error = 'lease expired', updated = ? "
+                "WHERE state = 'leased' AND lease_until < ? AND attempts >= max_attempts", (now, now)
+            )
+            row = self._db.execute(
+                "SELECT id, payload, attempts FROM jobs "
+                "WHERE (state = 'pending' AND available_at <= ?) OR (state = 'leased' AND lease_until < ?) "
+                "ORDER BY id LIMIT 1", (now, now)
+            ).fetchone()
+            if row is None:
+                return None
+            job_id, payload, attempts = row
+            self._db.execute(
+                "UPDATE jobs SET state = 'leased', attempts = ?, lease_until = ?, worker = ?, updated = ? WHERE id = ?",
+                (attempts + 1, now + self.lease, worker, now, job_id),
+            )
+            return job_id, json.loads(payload), attempts + 1
+        return self._write(op)
+
+    def heartbeat(self, job_id, worker):
+        # Extends the lease of a long job; False if it was taken over meanwhile
+        def op(now):
+            return self._db.execute(
+                "UPDATE jobs SET lease_until = ?, updated = ? WHERE id = ? AND state = 'leased' AND worker = ?",
+                (now + self.lease, now, job_id, worker),
+            ).rowcount == 1
+        return self._write(op)
+
+    def complete(self, job_id, worker, result):
+        # Acknowledgement; ignored if the lease was lost and another worker owns the job
+        def op(now):
+            return self._db.execute(
+                "UPDATE jobs SET state = 'done', result = ?, error = NULL, updated = ? "
+                "WHERE id = ? AND state = 'leased' AND worker = ?",
+                (json.dumps(result), now, job_id, worker),
+            ).rowcount == 1
+        return self._write(op)
+
+    def fail(self, job_id, worker, error):
+        def op(now):
+            row = self._db.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND state = 'leased' AND worker = ?",
+                (job_id, worker),
+            ).fetchone()
+            if row is None:
+                return None
+            attempts, max_attempts = row
+            if attempts >= max_attempts:
+                self._db.execute("UPDATE jobs SET state = 'dead', error = ?, updated = ? WHERE id = ?",
+                                 (error, now, job_id))
+                return "dead"
+            # Exponential backoff before the job becomes available again
+            self._db.execute(
+                "UPDATE jobs SET state = 'pending', error = ?, available_at = ?, lease_until = NULL, updated = ? "
+                "WHERE id = ?", (error, now + min(60, 2 ** attempts), now, job_id),
+            )
+            return "retry"
+        return self._write(op)
+
+    # --- maintenance ---
+
+    def requeue_dead(self):
+        def op(now):
+            return self._db.execute(
+                "UPDATE jobs SET state = 'pending', attempts = 0, delivered = 0, available_at = ?, updated = ? "
+                "WHERE state = 'dead'", (now, now),
+            ).rowcount
+        return self._write(op)
+
+    def purge(self, older_than_days=7):
+        # Delivered jobs are only kept for inspection; dead letters are kept
+        def op(now):
+            return self._db.execute(
+                "DELETE FROM jobs WHERE delivered = 1 AND state = 'done' AND updated < ?",
+                (now - older_than_days * 86400,),
+            ).rowcount
+        return self._write(op)
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._db.execute("SELECT state, COUNT(*) FROM jobs WHERE delivered = 0 GROUP BY state"))
+            counts["dead_total"] = self._db.execute("SELECT COUNT(*) FROM jobs WHERE state = 'dead'").fetchone()[0]
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._db.close()
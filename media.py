@@ -0,0 +1,90 @@
+import io
+import os
+import re
+import uuid
+
+from config import MEDIA_INMEMORY_MAX_BYTES, MEDIA_TEMP_DIR
+
+class MediaFile:
+    """A downloaded image: bytes in memory, or a unique temp file for big ones."""
+
+    def __init__(self, data=None, path=None):
+        self.data = data
+        self.path = path
+
+    @property
+    def source(self):
+        # What ocr_image / PIL accept; bytes pickle cheaply into pool workers
+        return self.data if self.data is not None else self.path
+
+    def open(self):
+        return io.BytesIO(self.data) if self.data is not None else open(self.path, "rb")
+
+    def read(self):
+        if self.data is not None:
+            return self.data
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def discard(self):
+        if self.path:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+        self.data = None
+
+
+TEMP_SUBDIR = "ocrbot"  # under MEDIA_TEMP_DIR, which may be shared (/tmp)
+_owner = "worker"
+
+
+def temp_dir():
+    return os.path.join(os.path.abspath(MEDIA_TEMP_DIR), TEMP_SUBDIR)
+
+
+def init_temp_dir(owner):
+    """Name this process's temp files ``<owner>-<uuid>`` and delete the
+    ones a previous run of ``owner`` left behind; they are never referenced
+    again. Files of other owners (worker.py on the same host) and anything
+    else in the directory are left alone, so only a single process per
+    owner may call this."""
+    global _owner
+    _owner = owner
+    directory = temp_dir()
+    os.makedirs(directory, exist_ok=True)
+    pattern = re.compile(re.escape(owner) + r"-[0-9a-f]{32}")
+    for entry in os.scandir(directory):
+        if pattern.fullmatch(entry.name) and entry.is_file(follow_symlinks=False):
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def source_to_file(source):
+    # ocr_image and friends take bytes, a path or a file object
+    return io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+
+async def _fetch(download_media, size):
+    # Images up to MEDIA_INMEMORY_MAX_BYTES never touch the disk; larger (or
+    # unknown-size) ones go to a uniquely named file so concurrent downloads
+    # cannot overwrite each other
+    if size and size <= MEDIA_INMEMORY_MAX_BYTES:
+        buf = await download_media(in_memory=True)
+        return MediaFile(data=bytes(buf.getbuffer()))
+    os.makedirs(temp_dir(), exist_ok=True)
+    # Pyrogram saves relative names under ./downloads, so always pass an absolute path
+    path = os.path.join(temp_dir(), f"{_owner}-{uuid.uuid4().hex}")
+    return MediaFile(path=await download_media(file_name=path))
+
+
+async def download(media_msg, media):
+    return await _fetch(media_msg.download, getattr(media, "file_size", 0))
+
+
+async def download_file_id(client, file_id, size=0):
+    # Re-fetch by file_id, e.g. for results that were served from a cache
+    return await _fetch(lambda **kw: client.download_media(file_id, **kw), size)
@@ -0,0 +1,195 @@
+import bisect
+import logging
+import time
+from contextlib import contextmanager
+
+from config import METRICS_HOST, METRICS_PORT
+
+log = logging.getLogger(__name__)
+
+# Stage latencies span sub-millisecond spell lookups to minute-long Gemini calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for key, value in self._values.items():
+            yield f"{self.name}{_labels(dict(key))} {value}"
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [per-bucket counts (last is +Inf), sum]
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for key, (counts, total) in self._series.items():
+            labels = dict(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels({**labels, 'le': bound})} {cumulative}"
+            yield f"{self.name}_sum{_labels(labels)} {total}"
+            yield f"{self.name}_count{_labels(labels)} {cumulative}"
+
+
+class Gauge:
+    # Read on every scrape; fn returns a number or {labels tuple: number}
+    def __init__(self, name, help, fn, kind="gauge"):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.kind = kind
+
+    def render(self):
+        try:
+            value = self.fn()
+        except Exception as e:
+            log.warning("metric %s failed: %s", self.name, e)
+            return
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        if isinstance(value, dict):
+            for labels, v in value.items():
+                yield f"{self.name}{_labels(dict(labels))} {v}"
+        else:
+            yield f"{self.name} {value}"
+
+
+_registry = []
+
+
+def counter(name, help):
+    metric = Counter(name, help)
+    _registry.append(metric)
+    return metric
+
+
+def histogram(name, help, buckets=DEFAULT_BUCKETS):
+    metric = Histogram(name, help, buckets)
+    _registry.append(metric)
+    return metric
+
+
+def gauge(name, help, fn, kind="gauge"):
+    # kind="counter" for monotonic values owned by another object (e.g. cache stats)
+    metric = Gauge(name, help, fn, kind)
+    _registry.append(metric)
+    return metric
+
+
+def render():
+    return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+
+STAGE_SECONDS = histogram("ocrbot_stage_seconds", "Time spent per pipeline stage")
+ERRORS = counter("ocrbot_errors_total", "Errors by pipeline stage")
+REQUESTS = counter("ocrbot_requests_total", "OCR requests by outcome")
+TELEGRAM_CALLS = counter("ocrbot_telegram_calls_total", "Bot API calls into chats by method and result")
+
+# --- stage timing ---
+
+# Inside a pool worker: timings of the current job, shipped back with the result
+_pending = None
+
+
+def observe_stage(stage, seconds):
+    if _pending is not None:
+        _pending.append((stage, seconds))
+    else:
+        STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+def observe_error(stage):
+    if _pending is not None:
+        _pending.append((stage, None))
+    else:
+        ERRORS.inc(stage=stage)
+
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        observe_error(stage)
+        raise
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def collect_stages(fn, *args, **kwargs):
+    # Pool worker entry point: returns (result, stage timings) so the parent
+    # process can record what happened in the child
+    global _pending
+    _pending = []
+    try:
+        return fn(*args, **kwargs), _pending
+    finally:
+        _pending = None
+
+
+def record_stages(stages):
+    for stage, seconds in stages:
+        if seconds is None:
+            ERRORS.inc(stage=stage)
+        else:
+            STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+# --- HTTP endpoint ---
+
+async def start_server(ready, host=METRICS_HOST, port=METRICS_PORT):
+    """Serve /metrics (Prometheus text), /healthz and /readyz. ``ready`` is a
+    callable telling whether the bot is connected and serving."""
+    from aiohttp import web
+
+    async def metrics_view(_):
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+    async def healthz(_):
+        # Answering at all means the event loop is alive
+        return web.Response(text="ok")
+
+    async def readyz(_):
+        return web.Response(text="ready") if ready() else web.Response(text="starting", status=503)
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_view)
+    app.router.add_get("/healthz", healthz)
+    app.router.add_get("/readyz", readyz)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    log.info("metrics on http://%s:%s/metrics", host, port)
+    return runner
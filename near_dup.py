@@ -0,0 +1,160 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from config import NEAR_DUP_PATH, NEAR_DUP_MAX_ITEMS, NEAR_DUP_MAX_DISTANCE
+from media import source_to_file
+
+COARSE_BITS = 64
+COARSE_CHUNKS = 5  # finds every entry within 4 bits of the 64-bit hash, most a bit further
+MAX_ASPECT_DIFF = 0.03  # relative; a different crop of a screenshot is not the same text
+
+
+def _dhash(gray, size):
+    # Difference hash: one bit per horizontally adjacent pixel pair
+    pixels = np.asarray(gray.resize((size + 1, size), Image.BOX), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def image_hash(source):
+    """(64-bit dHash, 256-bit dHash, aspect ratio) of an image, or None if it
+    cannot be decoded. The coarse hash finds candidates, the fine one
+    decides."""
+    try:
+        with Image.open(source_to_file(source)) as img:
+            aspect = img.width / img.height
+            # JPEGs decode at 1/2..1/8 scale, a hash needs only 17x16 pixels
+            img.draft("L", (128, 128))
+            gray = img.convert("L")
+    except Exception:
+        return None
+    return _dhash(gray, 8), _dhash(gray, 16), aspect
+
+
+def _chunks(bits=COARSE_BITS, parts=COARSE_CHUNKS):
+    # (shift, mask) per chunk; two hashes less than ``parts`` bits apart
+    # agree exactly on at least one chunk (pigeonhole)
+    bounds = [bits * i // parts for i in range(parts + 1)]
+    return [(lo, (1 << (hi - lo)) - 1) for lo, hi in zip(bounds, bounds[1:])]
+
+
+def _to_db(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class NearDuplicateIndex:
+    """Perceptual-hash index of recently OCRed images, so re-compressed,
+    resized or re-forwarded copies reuse an earlier result.
+
+    Multi-index hashing: the 64-bit hash is split into chunks, each chunk
+    value maps to the entries having it, and a lookup only compares the
+    256-bit hashes of entries sharing a chunk with the query. Entries point at ResultCache
+    keys, are evicted least recently used past ``max_items`` and persist
+    in SQLite. Thread-safe so it can be called through asyncio.to_thread.
+    """
+
+    def __init__(self, path=NEAR_DUP_PATH, max_items=NEAR_DUP_MAX_ITEMS, max_distance=NEAR_DUP_MAX_DISTANCE):
+        self.max_items = max_items
+        self.max_distance = max_distance
+        self._chunks = _chunks()
+        self._tables = [{} for _ in self._chunks]
+        self._entries = OrderedDict()  # id -> (coarse, fine, aspect, result key), oldest first
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, coarse INTEGER NOT NULL, fine BLOB NOT NULL, "
+            "aspect REAL NOT NULL, key TEXT NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        # Separate from __init__ so startup does not wait for it; lookups
+        # miss until it is done
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, coarse, fine, aspect, key FROM hashes ORDER BY accessed DESC LIMIT ?", (self.max_items,)
+            ).fetchall()
+            for entry_id, coarse, fine, aspect, key in reversed(rows):
+                self._insert(entry_id, (coarse % (1 << 64), int.from_bytes(fine, "big"), aspect, key))
+            self._db.execute("DELETE FROM hashes WHERE id NOT IN (SELECT id FROM hashes ORDER BY accessed DESC LIMIT ?)",
+                             (self.max_items,))
+            self._db.commit()
+            self._loaded = True
+
+    def _insert(self, entry_id, entry):
+        self._entries[entry_id] = entry
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            table.setdefault((entry[0] >> shift) & mask, []).append(entry_id)
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            chunk = (entry[0] >> shift) & mask
+            ids = table[chunk]
+            ids.remove(entry_id)
+            if not ids:
+                del table[chunk]
+
+    def lookup(self, image_hash, variant):
+        """ResultCache key of the closest earlier image OCRed with the same
+        settings (result_cache.variant), or None."""
+        coarse, fine, aspect = image_hash
+        prefix = variant + "|"
+        with self._lock:
+            best, best_distance = None, self.max_distance + 1
+            seen = set()
+            for table, (shift, mask) in zip(self._tables, self._chunks):
+                for entry_id in table.get((coarse >> shift) & mask, ()):
+                    if entry_id in seen:
+                        continue
+                    seen.add(entry_id)
+                    _, e_fine, e_aspect, key = self._entries[entry_id]
+                    if not key.startswith(prefix) or abs(e_aspect - aspect) > MAX_ASPECT_DIFF * aspect:
+                        continue
+                    distance = (e_fine ^ fine).bit_count()
+                    if distance < best_distance:
+                        best, best_distance = entry_id, distance
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best)
+            self._db.execute("UPDATE hashes SET accessed = ? WHERE id = ?", (time.time(), best))
+            self._db.commit()
+            return self._entries[best][3]
+
+    def add(self, image_hash, key):
+        coarse, fine, aspect = image_hash
+        with self._lock:
+            if not self._loaded:
+                return
+            entry_id = self._db.execute(
+                "INSERT INTO hashes (coarse, fine, aspect, key, accessed) VALUES (?, ?, ?, ?, ?)",
+                (_to_db(coarse), fine.to_bytes(32, "big"), aspect, key, time.time()),
+            ).lastrowid
+            self._insert(entry_id, (coarse, fine, aspect, key))
+            stale = []
+            while len(self._entries) > self.max_items:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                stale.append((oldest,))
+            self._db.executemany("DELETE FROM hashes WHERE id = ?", stale)
+            self._db.commit()
+
+    def stats(self):
+        return {"items": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
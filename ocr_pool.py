@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from config import OCR_WORKERS, OCR_QUEUE_SIZE, OCR_JOB_TIMEOUT, OCR_MAX_JOBS_PER_WORKER
+import metrics
+
+log = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _init_worker(warmed, initializer, initargs):
+    # Runs first in every worker process; counts the ones that are ready
+    if initializer is not None:
+        initializer(*initargs)
+    with warmed.get_lock():
+        warmed.value += 1
+
+
+class OCRPool:
+    """Runs blocking OCR jobs in worker processes so the event loop stays free.
+
+    At most ``workers`` jobs run at once; up to ``queue_size`` more wait for a
+    free worker, anything beyond that is rejected with QueueFull.
+    ``initializer(*initargs)`` runs once in every worker process before it
+    takes jobs, also in workers started to replace recycled ones.
+    """
+
+    def __init__(self, workers=OCR_WORKERS, queue_size=OCR_QUEUE_SIZE,
+                 timeout=OCR_JOB_TIMEOUT, max_jobs_per_worker=OCR_MAX_JOBS_PER_WORKER,
+                 initializer=None, initargs=()):
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.initializer = initializer
+        self.initargs = initargs
+        self._context = multiprocessing.get_context("spawn")
+        self._warmed = None
+        self._executor = None
+        self._slots = asyncio.Semaphore(self.workers)
+        self._waiting = 0
+        self._running = 0
+
+    @property
+    def waiting(self):
+        return self._waiting
+
+    @property
+    def running(self):
+        return self._running
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn is required for max_tasks_per_child; workers exit and are
+            # replaced after N jobs so leaked memory never accumulates
+            self._warmed = self._context.Value("i", 0)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=self._context,
+                max_tasks_per_child=self.max_jobs_per_worker or None,
+                initializer=_init_worker,
+                initargs=(self._warmed, self.initializer, self.initargs),
+            )
+        return self._executor
+
+    async def warm_up(self):
+        """Start every worker process now and wait until each has run the
+        initializer, instead of paying for it on the first requests."""
+        start = time.perf_counter()
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        # Processes are spawned per submitted job while none is idle, so one
+        # no-op per worker brings the whole pool up
+        await asyncio.gather(*(loop.run_in_executor(executor, os.getpid) for _ in range(self.workers)))
+        while self._warmed.value < self.workers:
+            await asyncio.sleep(0.05)
+        log.info("%s OCR worker(s) ready in %.2fs", self.workers, time.perf_counter() - start)
+
+    async def run(self, fn, *args, on_queued=None, **kwargs):
+        # Backpressure: refuse new work once the wait queue is full
+        if self._slots.locked():
+            if self._waiting >= self.queue_size:
+                raise QueueFull(self._waiting)
+            if on_queued:
+                await on_queued(self._waiting + 1)
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+
+        loop = asyncio.get_running_loop()
+        # Workers time their stages and send the timings back with the result
+        call = (metrics.collect_stages, fn, *args)
+        try:
+            try:
+                future = self._get_executor().submit(*call, **kwargs)
+            except BrokenProcessPool:
+                self._reset()
+                future = self._get_executor().submit(*call, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        self._running += 1
+
+        # The slot is held until the worker really finishes, even if we stop
+        # waiting on a timeout, so a stuck job still counts against capacity
+        def _release(_):
+            loop.call_soon_threadsafe(self._job_done)
+        future.add_done_callback(_release)
+
+        try:
+            result, stages = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            metrics.ERRORS.inc(stage="timeout")
+            raise
+        except BrokenProcessPool:
+            metrics.ERRORS.inc(stage="worker_crash")
+            # A worker died (e.g. Tesseract crashed); start fresh for the next job
+            log.warning("OCR worker pool broke, restarting it")
+            self._reset()
+            raise
+        metrics.record_stages(stages)
+        return result
+
+    def _job_done(self):
+        self._running -= 1
+        self._slots.release()
+
+    def _reset(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -1,8 +1,29 @@
-from PIL import Image, ImageEnhance, ImageFilter
-import pytesseract
-from autocorrect import Speller
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
 import os
-from config import GEMINI_API_KEY
+from collections import OrderedDict
+import logging
+import time
+from config import OCR_ENGINE, OCR_ENGINE_MAX_HANDLES, PREPROCESS_PROFILE, WARMUP_LANGS
+from preprocess import preprocess
+import spellcheck
+from media import source_to_file
+import documents
+from metrics import timed
+
+# tesserocr binds libtesseract directly; optional, pytesseract is the fallback.
+# Both are imported on first use: the bot process never runs Tesseract itself,
+# and pool workers import them during warm_up().
+_tesserocr = None  # the module, or False when it is not installed
+
+def load_tesserocr():
+    global _tesserocr
+    if _tesserocr is None:
+        try:
+            import tesserocr
+            _tesserocr = tesserocr
+        except ImportError:
+            _tesserocr = False
+    return _tesserocr or None
 
 # List of at least 20 supported Tesseract language codes
 SUPPORTED_LANGS = [
@@ -10,37 +31,216 @@ SUPPORTED_LANGS = [
     "ara", "tur", "nld", "pol", "ces", "ell", "kor", "ukr", "ron", "swe"
 ]
 
-spell = Speller(lang='en')
+# Bump whenever preprocessing/OCR output changes so cached results are not reused
+PIPELINE_VERSION = 5
+
+# Tesseract OSD script name -> languages to OCR with when no language is set
+SCRIPT_LANGS = {
+    "Latin": ["eng", "spa", "fra", "deu", "ita", "por", "tur", "nld", "pol", "ces", "ron", "swe"],
+    "Devanagari": ["hin"],
+    "Cyrillic": ["rus", "ukr"],
+    "Arabic": ["ara"],
+    "Greek": ["ell"],
+    "Han": ["chi_sim"],
+    "Japanese": ["jpn"],
+    "Hiragana": ["jpn"],
+    "Katakana": ["jpn"],
+    "Korean": ["kor"],
+    "Hangul": ["kor"],
+}
+# What to run for a detected script when the user has no matching soft default
+SCRIPT_DEFAULTS = {
+    "Latin": "eng",
+    "Devanagari": "hin+eng",
+    "Cyrillic": "rus+ukr",
+    "Arabic": "ara",
+    "Greek": "ell+eng",
+    "Han": "chi_sim",
+    "Japanese": "jpn",
+    "Hiragana": "jpn",
+    "Katakana": "jpn",
+    "Korean": "kor",
+    "Hangul": "kor",
+}
+FALLBACK_LANG = "eng"
+OSD_MAX_SIDE = 1600  # OSD only needs legible glyphs, not full resolution
+OSD_MIN_CONFIDENCE = 1.0
+
+log = logging.getLogger(__name__)
 
-def preprocess_image(image_path):
-    img = Image.open(image_path).convert("L")  # grayscale
-    img = img.point(lambda x: 0 if x < 140 else 255)  # binarize
-    img = img.filter(ImageFilter.MedianFilter())  # denoise
+def preprocess_image(image, profile=None, timings=None):
+    # Accepts a path, file object or PIL image; see preprocess.PROFILES
+    if not isinstance(image, Image.Image):
+        with timed("decode"):
+            image = Image.open(image)
+            image.load()
+    if timings is None:
+        timings = {}
+    with timed("preprocess"):
+        img = preprocess(image, profile or PREPROCESS_PROFILE, timings)
+    log.debug("preprocess %s: %s", profile or PREPROCESS_PROFILE,
+              ", ".join(f"{k}={v:.1f}ms" for k, v in timings.items()))
     return img
 
-def extract_text(file_path: str, lang=None) -> str:
-    # If no lang specified, use all supported for auto-detection
-    if not lang:
-        lang = "+".join(SUPPORTED_LANGS)
+# Initialized Tesseract API handles, one per language combination, kept for
+# the life of the worker process so traineddata is loaded only once
+_tess_apis = OrderedDict()
+
+def use_tesserocr():
+    if OCR_ENGINE == "pytesseract":
+        return False
+    if load_tesserocr() is None:
+        if OCR_ENGINE == "tesserocr":
+            raise RuntimeError("OCR_ENGINE=tesserocr but tesserocr is not installed")
+        return False
+    return True
+
+def get_tess_api(lang, psm=None):
+    key = (lang, psm)
+    api = _tess_apis.get(key)
+    if api is not None:
+        _tess_apis.move_to_end(key)
+        return api
+    tesserocr = load_tesserocr()
+    if psm is None:
+        api = tesserocr.PyTessBaseAPI(lang=lang)
+    else:
+        api = tesserocr.PyTessBaseAPI(lang=lang, psm=psm)
+    _tess_apis[key] = api
+    # Each handle holds its models in memory, keep only the most recently used
+    while len(_tess_apis) > OCR_ENGINE_MAX_HANDLES:
+        _, old = _tess_apis.popitem(last=False)
+        old.End()
+    return api
+
+def _text_from_data(data):
+    # Rebuild image_to_string-style text from image_to_data word boxes
+    out = []
+    last_par = last_line = None
+    for i, word in enumerate(data["text"]):
+        if data["level"][i] != 5 or not word.strip():
+            continue
+        par = (data["block_num"][i], data["par_num"][i])
+        line = par + (data["line_num"][i],)
+        if last_line is not None:
+            out.append("\n\n" if par != last_par else "\n" if line != last_line else " ")
+        out.append(word)
+        last_par, last_line = par, line
+    return "".join(out)
+
+def run_tesseract(img, lang, timeout=0, with_confidences=False):
+    # with_confidences also returns {word: confidence 0-100} from the same pass
+    if use_tesserocr():
+        api = get_tess_api(lang)
+        api.SetImage(img)
+        try:
+            # GetUTF8Text has no deadline; like pytesseract's timeout this
+            # keeps a pathological image from holding the worker forever
+            if not api.Recognize(int(timeout * 1000)):
+                raise RuntimeError("Tesseract timed out or failed to recognize the image")
+            text = api.GetUTF8Text()
+            if not with_confidences:
+                return text
+            confidences = {}
+            for word, conf in api.MapWordConfidences():
+                confidences[word] = max(conf, confidences.get(word, 0))
+            return text, confidences
+        finally:
+            api.Clear()
+    import pytesseract
+    # timeout kills the tesseract subprocess if it hangs (0 = no limit)
+    if not with_confidences:
+        return pytesseract.image_to_string(img, lang=lang, timeout=timeout)
+    data = pytesseract.image_to_data(img, lang=lang, timeout=timeout, output_type=pytesseract.Output.DICT)
+    confidences = {}
+    for word, conf in zip(data["text"], data["conf"]):
+        if word.strip():
+            confidences[word] = max(float(conf), confidences.get(word, 0))
+    return _text_from_data(data), confidences
+
+def detect_script(img, timeout=0):
+    # Cheap first pass: orientation and script detection on a downscaled copy
+    small = img.copy()
+    small.thumbnail((OSD_MAX_SIDE, OSD_MAX_SIDE))
+    try:
+        if use_tesserocr():
+            api = get_tess_api("osd", load_tesserocr().PSM.OSD_ONLY)
+            api.SetImage(small)
+            try:
+                osd = api.DetectOrientationScript() or {}
+            finally:
+                api.Clear()
+            script, conf = osd.get("script_name"), osd.get("script_conf", 0)
+        else:
+            import pytesseract
+            osd = pytesseract.image_to_osd(small, output_type=pytesseract.Output.DICT, timeout=timeout)
+            script, conf = osd.get("script"), osd.get("script_conf", 0)
+    except Exception:
+        # OSD refuses images with too few characters
+        return None
+    if conf < OSD_MIN_CONFIDENCE:
+        return None
+    return script
+
+def pick_langs(script, hint=None):
+    # Prefer the user's remembered language when it fits the detected script
+    hint_langs = hint.split("+") if hint else []
+    if script in SCRIPT_LANGS:
+        if hint_langs and all(l in SCRIPT_LANGS[script] for l in hint_langs):
+            return hint
+        return SCRIPT_DEFAULTS[script]
+    return hint or FALLBACK_LANG
+
+def ocr_image(source, lang=None, hint=None, timeout=0, spell=True):
+    # source is image bytes or a path. Returns (text, lang used). Without a
+    # language, detect the script first and OCR with only the matching 1-3
+    # models instead of all of them.
     try:
-        img = preprocess_image(file_path)
-        text = pytesseract.image_to_string(img, lang=lang)
-        corrected_text = spell(text)
-        return corrected_text.strip() or "No text found."
+        img = preprocess_image(source_to_file(source))
+        if not lang:
+            with timed("osd"):
+                lang = pick_langs(detect_script(img, timeout=timeout), hint)
+        return recognize(img, lang, timeout=timeout, spell=spell) or "No text found.", lang
     except Exception as e:
-        return f"OCR error: {str(e)}"
+        return f"OCR error: {str(e)}", lang
 
-# Gemini OCR integration
-def gemini_ocr(file_path: str) -> str:
+def recognize(img, lang, timeout=0, spell=True):
+    # Tesseract plus spell correction on an already preprocessed image
+    if spell and spellcheck.supports(lang):
+        with timed("tesseract"):
+            text, confidences = run_tesseract(img, lang, timeout=timeout, with_confidences=True)
+        with timed("spell"):
+            text = spellcheck.correct(text, lang, confidences)
+    else:
+        with timed("tesseract"):
+            text = run_tesseract(img, lang, timeout=timeout)
+    return text.strip()
+
+def ocr_page(source, kind, index, lang=None, hint=None, timeout=0, spell=True):
+    # One page of a PDF/TIFF; the page is rendered inside the worker
     try:
-        import google.generativeai as genai
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        img = Image.open(file_path)
-        response = model.generate_content([
-            "Extract all text from this image. Return only the text, no commentary.",
-            img
-        ])
-        return response.text.strip() or "No text found."
+        with timed("render"):
+            page = documents.render_page(source, kind, index)
     except Exception as e:
-        return f"Gemini OCR error: {str(e)}" 
\ No newline at end of file
+        return f"OCR error: {str(e)}", lang
+    return ocr_image(page, lang=lang, hint=hint, timeout=timeout, spell=spell)
+
+def extract_text(source, lang=None, timeout=0, spell=True) -> str:
+    return ocr_image(source, lang=lang, timeout=timeout, spell=spell)[0]
+
+def warm_up(langs=WARMUP_LANGS):
+    # OCRPool initializer: runs once in every worker process, including ones
+    # started to replace recycled workers. Imports the engine, loads the
+    # language models, OSD and spell dictionaries and OCRs a tiny image, so
+    # the first real request does not pay for any of it.
+    start = time.perf_counter()
+    img = Image.new("L", (320, 60), 255)
+    ImageDraw.Draw(img).text((10, 20), "Warm up 123", fill=0)
+    for lang in langs:
+        try:
+            run_tesseract(img, lang, with_confidences=spellcheck.supports(lang))
+            spellcheck.preload(lang)
+        except Exception as e:
+            log.warning("warm-up for %s failed: %s", lang, e)
+    detect_script(img)
+    log.info("worker %s warmed up (%s) in %.2fs", os.getpid(), "+".join(langs), time.perf_counter() - start)
@@ -0,0 +1,193 @@
+import time
+
+import numpy as np
+from PIL import Image, ImageFilter, ImageOps
+
+# Tesseract is most accurate when lines of text are roughly this tall
+TARGET_TEXT_HEIGHT = 32
+# Cap on width x height, for huge uploads before any other work and again
+# after rescaling. A pixel budget, not a side cap, so tall screenshots keep
+# their width and glyph detail
+MAX_PIXELS = 12_000_000
+DESKEW_MAX_ANGLE = 5.0
+DESKEW_STEP = 0.5
+
+
+def _binarize_lut(threshold):
+    # 256-entry lookup table, applied in C by Image.point
+    return [0 if x <= threshold else 255 for x in range(256)]
+
+
+def otsu_threshold(img):
+    hist = np.asarray(img.histogram()[:256], dtype=np.float64)
+    total = hist.sum()
+    if not total:
+        return 127
+    w0 = np.cumsum(hist)
+    w1 = total - w0
+    m = np.cumsum(hist * np.arange(256))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (m * total - m[-1] * w0) ** 2 / (w0 * w1)
+    return int(np.argmax(np.nan_to_num(between)))
+
+
+def _dark_text(img):
+    # Keep text black on white; light-on-dark images come out inverted otherwise
+    black = img.histogram()[0]
+    if black > img.width * img.height / 2:
+        return ImageOps.invert(img)
+    return img
+
+
+def _light_on_dark(img):
+    # Most pixels falling in the dark class means a dark background
+    return sum(img.histogram()[:otsu_threshold(img) + 1]) > img.width * img.height / 2
+
+
+def estimate_text_height(binary):
+    # Median height of runs of rows that contain ink (horizontal projection)
+    ink = np.asarray(binary) == 0
+    rows = ink.mean(axis=1) > 0.002
+    if not rows.any():
+        return None
+    edges = np.diff(np.concatenate(([0], rows.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    heights = ends - starts
+    heights = heights[heights > 2]
+    if not len(heights):
+        return None
+    return float(np.median(heights))
+
+
+def _resize(img, scale):
+    w, h = max(1, round(img.width * scale)), max(1, round(img.height * scale))
+    return img.resize((w, h), Image.LANCZOS if scale < 1 else Image.BICUBIC)
+
+
+def grayscale(img):
+    return img.convert("L")
+
+
+def autocontrast(img):
+    return ImageOps.autocontrast(img, cutoff=1)
+
+
+def limit_size(img):
+    pixels = img.width * img.height
+    if pixels > MAX_PIXELS:
+        img = _resize(img, (MAX_PIXELS / pixels) ** 0.5)
+    return img
+
+
+def normalize_scale(img):
+    img = limit_size(img)
+    probe = img.point(_binarize_lut(otsu_threshold(img)))
+    height = estimate_text_height(_dark_text(probe))
+    if not height:
+        return img
+    scale = min(max(TARGET_TEXT_HEIGHT / height, 0.3), 4.0)
+    scale = min(scale, (MAX_PIXELS / (img.width * img.height)) ** 0.5)
+    # Resampling is not free, leave images that are already close alone
+    if 0.8 <= scale <= 1.25:
+        return img
+    return _resize(img, scale)
+
+
+def deskew(img):
+    small = img.copy()
+    small.thumbnail((800, 800))
+    small = _dark_text(small.point(_binarize_lut(otsu_threshold(small))))
+    if not (np.asarray(small) == 0).any():
+        # Blank or uniform: nothing to align
+        return img
+
+    def score(angle):
+        rotated = small.rotate(angle, resample=Image.NEAREST, fillcolor=255)
+        profile = (np.asarray(rotated) == 0).sum(axis=1).astype(np.float64)
+        # Aligned text lines give the sharpest row profile
+        return float(np.square(np.diff(profile)).sum())
+
+    # Another angle has to beat the image as it is, so ties keep 0
+    best_angle, best_score = 0.0, score(0.0)
+    for angle in np.arange(-DESKEW_MAX_ANGLE, DESKEW_MAX_ANGLE + DESKEW_STEP / 2, DESKEW_STEP):
+        if abs(angle) < DESKEW_STEP / 2:
+            continue
+        current = score(float(angle))
+        if current > best_score:
+            best_angle, best_score = float(angle), current
+    if best_angle == 0.0:
+        return img
+    fill = 0 if _light_on_dark(img) else 255
+    return img.rotate(best_angle, resample=Image.BICUBIC, expand=True, fillcolor=fill)
+
+
+def otsu(img):
+    return _dark_text(img.point(_binarize_lut(otsu_threshold(img))))
+
+
+def adaptive(img, window=31, offset=10, strip=256):
+    # Mean-of-neighbourhood threshold using an integral image; copes with
+    # shadows and uneven lighting where one global threshold fails.
+    # Assumes dark text, so flip light-on-dark images first. Works in strips
+    # of rows: full-size integral images cost hundreds of MB at MAX_PIXELS.
+    if _light_on_dark(img):
+        img = ImageOps.invert(img)
+    a = np.asarray(img)
+    h, w = a.shape
+    r = window // 2
+    x0 = np.clip(np.arange(w) - r, 0, w)
+    x1 = np.clip(np.arange(w) + r + 1, 0, w)
+    widths = x1 - x0
+    out = np.empty((h, w), dtype=np.uint8)
+    for top in range(0, h, strip):
+        bottom = min(top + strip, h)
+        # The strip's rows plus the window's reach above and below
+        lo, hi = max(0, top - r), min(h, bottom + r)
+        ii = np.zeros((hi - lo + 1, w + 1), dtype=np.int64)
+        ii[1:, 1:] = a[lo:hi].cumsum(axis=0, dtype=np.int64).cumsum(axis=1)
+        rows = np.arange(top, bottom)
+        y0 = np.clip(rows - r, 0, h) - lo
+        y1 = np.clip(rows + r + 1, 0, h) - lo
+        sums = ii[y1][:, x1] - ii[y0][:, x1] - ii[y1][:, x0] + ii[y0][:, x0]
+        means = sums / np.outer(y1 - y0, widths)
+        out[top:bottom] = np.where(a[top:bottom] > means - offset, 255, 0)
+    return _dark_text(Image.fromarray(out, mode="L"))
+
+
+def denoise(img):
+    return img.filter(ImageFilter.MedianFilter(3))
+
+
+# Stage registry; profiles are ordered lists of stage names
+STAGES = {
+    "grayscale": grayscale,
+    "autocontrast": autocontrast,
+    "limit_size": limit_size,
+    "normalize_scale": normalize_scale,
+    "deskew": deskew,
+    "otsu": otsu,
+    "adaptive": adaptive,
+    "denoise": denoise,
+}
+
+PROFILES = {
+    "fast": ["grayscale", "limit_size", "otsu"],
+    "balanced": ["grayscale", "normalize_scale", "otsu", "denoise"],
+    "quality": ["grayscale", "autocontrast", "normalize_scale", "deskew", "adaptive", "denoise"],
+}
+
+
+def register_stage(name, func):
+    STAGES[name] = func
+
+
+def preprocess(img, profile="balanced", timings=None):
+    # timings, if given, is filled with stage name -> milliseconds
+    stages = PROFILES[profile] if isinstance(profile, str) else profile
+    for name in stages:
+        start = time.perf_counter()
+        img = STAGES[name](img)
+        if timings is not None:
+            timings[name] = (time.perf_counter() - start) * 1000
+    return img
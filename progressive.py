@@ -0,0 +1,151 @@
+import asyncio
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from config import PROGRESSIVE_MIN_BLOCKS, PROGRESSIVE_MIN_PIXELS
+from media import source_to_file
+from metrics import timed
+import ocr_utils
+from preprocess import otsu
+
+BLANK_ROW_INK = 0.002  # share of the width; rows with less ink are blank
+PARAGRAPH_MIN_GAP = 8  # rows; smaller gaps are line spacing
+BLOCK_PADDING = 10  # white border around a block, Tesseract reads edges badly
+
+
+def worth_splitting(source, min_pixels=PROGRESSIVE_MIN_PIXELS):
+    # Reads only the image header. Splitting costs a pool job per part and a
+    # Tesseract pass per block, which only pays off on big pages
+    with Image.open(source_to_file(source)) as img:
+        return bool(min_pixels) and img.width * img.height >= min_pixels
+
+
+def _paragraph_bands(img):
+    # Fallback layout analysis for pytesseract: full-width bands split at
+    # blank gaps clearly wider than the usual line spacing
+    ink = (np.asarray(otsu(img.convert("L"))) == 0).sum(axis=1) > max(1, img.width * BLANK_ROW_INK)
+    edges = np.diff(np.concatenate(([0], ink.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    if not len(starts):
+        return []
+    gaps = starts[1:] - ends[:-1]
+    # The lower quartile of the gaps is the line spacing even when most
+    # paragraphs are a single line
+    threshold = max(PARAGRAPH_MIN_GAP, 1.5 * float(np.percentile(gaps, 25))) if len(gaps) else 0
+    bands, top = [], starts[0]
+    for i, gap in enumerate(gaps):
+        if gap > threshold:
+            bands.append((0, int(top), img.width, int(ends[i])))
+            top = starts[i + 1]
+    bands.append((0, int(top), img.width, int(ends[-1])))
+    return bands
+
+
+def find_blocks(img, lang):
+    """Text blocks of a preprocessed image as (left, top, right, bottom) boxes
+    in reading order, from Tesseract's layout analysis when tesserocr is
+    available."""
+    if not ocr_utils.use_tesserocr():
+        return _paragraph_bands(img)
+    tesserocr = ocr_utils.load_tesserocr()
+    api = ocr_utils.get_tess_api(lang)
+    api.SetImage(img)
+    try:
+        components = api.GetComponentImages(tesserocr.RIL.BLOCK, True)
+    finally:
+        api.Clear()
+    return [(box["x"], box["y"], box["x"] + box["w"], box["y"] + box["h"]) for _, box, _, _ in components]
+
+
+def _parts(blocks):
+    # 1, 2, 4, ... blocks per part: the first text comes back quickly and
+    # later parts amortize the per-job overhead
+    parts, size = [], 1
+    while blocks:
+        parts.append(blocks[:size])
+        blocks, size = blocks[size:], size * 2
+    return parts
+
+
+def plan_blocks(source, lang=None, hint=None, timeout=0, spell=True, min_blocks=PROGRESSIVE_MIN_BLOCKS):
+    # Runs in a pool worker. Returns (text, None, lang) when the image has
+    # too few blocks to be worth splitting (it is simply recognized), else
+    # (None, parts, lang) with parts a list of lists of block images.
+    try:
+        img = ocr_utils.preprocess_image(source_to_file(source))
+        if not lang:
+            with timed("osd"):
+                lang = ocr_utils.pick_langs(ocr_utils.detect_script(img, timeout=timeout), hint)
+        with timed("layout"):
+            blocks = find_blocks(img, lang)
+        if len(blocks) < min_blocks:
+            return ocr_utils.recognize(img, lang, timeout=timeout, spell=spell) or "No text found.", None, lang
+        crops = [ImageOps.expand(img.crop(box).convert("L"), border=BLOCK_PADDING, fill=255) for box in blocks]
+        return None, _parts(crops), lang
+    except Exception as e:
+        return f"OCR error: {str(e)}", None, lang
+
+
+def ocr_blocks(crops, lang, timeout=0, spell=True):
+    # Runs in a pool worker: recognize one part, block by block
+    try:
+        texts = [ocr_utils.recognize(crop, lang, timeout=timeout, spell=spell) for crop in crops]
+    except Exception as e:
+        return f"OCR error: {str(e)}", lang
+    return "\n\n".join(text for text in texts if text), lang
+
+
+def join_parts(texts):
+    return "\n\n".join(text for text in texts if text) or "No text found."
+
+
+async def run_in_order(run, calls, on_progress=None):
+    """Run ``calls`` ((fn, args, kwargs) tuples) concurrently through
+    ``run(fn, *args, **kwargs)`` and return their results in order.
+
+    Whenever more leading results are finished, ``on_progress(prefix)`` is
+    awaited with them (not for the complete list, the caller has that).
+    If one call fails the others are cancelled.
+    """
+    jobs = [asyncio.ensure_future(run(fn, *args, **kwargs)) for fn, args, kwargs in calls]
+    reported = 0
+    try:
+        pending = set(jobs)
+        while pending:
+            finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for job in finished:
+                job.result()
+            prefix = reported
+            while prefix < len(jobs) and jobs[prefix].done():
+                prefix += 1
+            if on_progress and reported < prefix < len(jobs):
+                reported = prefix
+                await on_progress([job.result() for job in jobs[:prefix]])
+        return [job.result() for job in jobs]
+    except BaseException:
+        for job in jobs:
+            job.cancel()
+        raise
+
+
+async def ocr_progressive(run, source, lang=None, hint=None, spell=True, timeout=0, on_progress=None):
+    """OCR of one image block by block. ``run`` executes a function in a
+    worker as in tiling.ocr_tiled; ``on_progress(text so far, parts done,
+    parts)`` follows the text in reading order. Returns (text, lang used)."""
+    text, parts, lang = await run(plan_blocks, source, lang=lang, hint=hint, timeout=timeout, spell=spell)
+    if parts is None:
+        return text, lang
+
+    async def report(results):
+        if any(text.startswith("OCR error") for text, _ in results):
+            return
+        await on_progress(join_parts([text for text, _ in results]), len(results), len(parts))
+
+    calls = [(ocr_blocks, (crops, lang), dict(timeout=timeout, spell=spell)) for crops in parts]
+    results = await run_in_order(run, calls, report if on_progress else None)
+    errors = [text for text, _ in results if text.startswith("OCR error")]
+    if errors:
+        # As in ocr_tiled: a partial text must not pass for the whole image
+        return errors[0], lang
+    return join_parts([text for text, _ in results]), lang
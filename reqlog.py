@@ -0,0 +1,41 @@
+import logging
+import random
+import uuid
+
+from config import LOG_SAMPLE_RATE
+
+log = logging.getLogger("ocrbot.request")
+
+
+class RequestLogger(logging.LoggerAdapter):
+    """Per-request logger: every line carries the request id, chat and user so
+    the steps of one OCR job can be grepped together. Only LOG_SAMPLE_RATE of
+    requests log at INFO and below; warnings and errors are always kept."""
+
+    def __init__(self, request_id, sampled, **fields):
+        super().__init__(log, {"request_id": request_id, **fields})
+        self.request_id = request_id
+        self.sampled = sampled
+
+    def isEnabledFor(self, level):
+        if level < logging.WARNING and not self.sampled:
+            return False
+        return super().isEnabledFor(level)
+
+    def process(self, msg, kwargs):
+        context = " ".join(f"{k}={v}" for k, v in self.extra.items())
+        return f"[{context}] {msg}", kwargs
+
+    def event(self, name, level=logging.INFO, **fields):
+        # Structured line: event name followed by key=value pairs
+        self.log(level, "%s %s", name, " ".join(f"{k}={v}" for k, v in fields.items()))
+
+
+def for_message(message):
+    return RequestLogger(
+        uuid.uuid4().hex[:8],
+        random.random() < LOG_SAMPLE_RATE,
+        chat=message.chat.id,
+        user=message.from_user.id if message.from_user else None,
+        msg=message.id,
+    )
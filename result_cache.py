@@ -0,0 +1,129 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config import (
+    RESULT_CACHE_PATH, RESULT_CACHE_MEMORY_ITEMS, RESULT_CACHE_MAX_MB, RESULT_CACHE_MAX_AGE_DAYS,
+)
+
+
+def variant(lang, version, spell):
+    # Prefix of every key: results differ by language, pipeline and spell setting
+    return f"v{version}|{lang or 'auto'}|{'spell' if spell else 'raw'}"
+
+
+def file_key(file_unique_id, lang, version, spell=True):
+    # Telegram's file_unique_id is stable across chats and forwards
+    return f"{variant(lang, version, spell)}|tg:{file_unique_id}"
+
+
+def content_key(data: bytes, lang, version, spell=True):
+    return f"{variant(lang, version, spell)}|sha256:{hashlib.sha256(data).hexdigest()}"
+
+
+class ResultCache:
+    """Two-level OCR result cache: an in-memory LRU in front of SQLite.
+
+    Thread-safe so it can be called through asyncio.to_thread.
+    """
+
+    EVICT_EVERY = 100  # puts between disk eviction passes
+
+    def __init__(self, path=RESULT_CACHE_PATH, memory_items=RESULT_CACHE_MEMORY_ITEMS,
+                 max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024,
+                 max_age=RESULT_CACHE_MAX_AGE_DAYS * 86400):
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._memory = OrderedDict()  # key -> (text, created)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results(accessed)")
+        self._db.commit()
+        self._puts = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _remember(self, key, text, created):
+        self._memory[key] = (text, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key, count_miss=True):
+        # count_miss=False for a first-level probe that will be followed by another lookup
+        with self._lock:
+            now = time.time()
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[1] <= self.max_age:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[0]
+                # Expired; the disk row is too, and goes at the next eviction
+                del self._memory[key]
+            row = self._db.execute(
+                "SELECT text, created FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age:
+                if count_miss:
+                    self.misses += 1
+                return None
+            self._db.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self._remember(key, row[0], row[1])
+            self.disk_hits += 1
+            return row[0]
+
+    def put(self, keys, text):
+        now = time.time()
+        size = len(text.encode("utf-8"))
+        with self._lock:
+            for key in keys:
+                self._remember(key, text, now)
+            self._db.executemany(
+                "INSERT OR REPLACE INTO results (key, text, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                [(key, text, size, now, now) for key in keys],
+            )
+            self._db.commit()
+            self._puts += 1
+            if self._puts % self.EVICT_EVERY == 0:
+                self._evict(now)
+
+    def _evict(self, now):
+        self._db.execute("DELETE FROM results WHERE created < ?", (now - self.max_age,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total > self.max_bytes:
+            # Drop least recently used rows until we are back under budget
+            excess = total - self.max_bytes
+            freed = 0
+            stale = []
+            for key, size in self._db.execute("SELECT key, size FROM results ORDER BY accessed"):
+                stale.append((key,))
+                freed += size
+                if freed >= excess:
+                    break
+            self._db.executemany("DELETE FROM results WHERE key = ?", stale)
+        self._db.commit()
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "lookups": lookups,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,196 @@
+import asyncio
+import contextlib
+import time
+from collections import OrderedDict, deque
+
+from config import (
+    OCR_WORKERS, OCR_QUEUE_SIZE, SCHED_USER_MAX_CONCURRENT, SCHED_USER_RATE_PER_MIN, SCHED_USER_BURST,
+)
+from ocr_pool import QueueFull
+import metrics
+from ratelimit import TokenBucket
+
+
+class RateLimited(Exception):
+    pass
+
+
+class _Lane:
+    # Two-level round robin: chats take turns, and users take turns inside a chat
+
+    def __init__(self):
+        self.chats = OrderedDict()  # chat_id -> OrderedDict(user_id -> deque of jobs)
+        self.size = 0
+
+    def push(self, job):
+        users = self.chats.setdefault(job.chat_id, OrderedDict())
+        users.setdefault(job.user_id, deque()).append(job)
+        self.size += 1
+
+    def pop(self, can_run):
+        # First job whose user is under the concurrency cap, rotating both levels
+        for chat_id in list(self.chats):
+            users = self.chats[chat_id]
+            for user_id in list(users):
+                if not can_run(user_id):
+                    continue
+                jobs = users.pop(user_id)
+                job = jobs.popleft()
+                if jobs:
+                    users[user_id] = jobs  # back of the user ring
+                self.chats.pop(chat_id)
+                if users:
+                    self.chats[chat_id] = users  # back of the chat ring
+                self.size -= 1
+                return job
+        return None
+
+    def remove(self, job):
+        users = self.chats.get(job.chat_id)
+        if users and job.user_id in users:
+            jobs = users[job.user_id]
+            if job in jobs:
+                jobs.remove(job)
+                self.size -= 1
+                if not jobs:
+                    del users[job.user_id]
+                if not users:
+                    del self.chats[job.chat_id]
+
+
+class _Job:
+    __slots__ = ("user_id", "chat_id", "granted", "submitted")
+
+    def __init__(self, user_id, chat_id):
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.granted = asyncio.get_running_loop().create_future()
+        self.submitted = time.monotonic()
+
+
+class FairScheduler:
+    """Admission control in front of the OCR pool.
+
+    Jobs wait in a priority lane (admins, small images) or the normal lane and
+    are granted one of ``capacity`` slots fairly across chats and users, so a
+    single flooding sender cannot starve everyone else. Until set_ready() is
+    called (workers warmed up) jobs are accepted but held in the queue.
+    """
+
+    PRIORITY_BURST = 3  # priority jobs served before letting one normal job through
+    MAX_BUCKETS = 10000
+
+    def __init__(self, capacity=OCR_WORKERS, queue_size=OCR_QUEUE_SIZE,
+                 user_max_concurrent=SCHED_USER_MAX_CONCURRENT,
+                 user_rate_per_min=SCHED_USER_RATE_PER_MIN, user_burst=SCHED_USER_BURST):
+        self.capacity = capacity
+        self.queue_size = queue_size
+        self.user_max_concurrent = user_max_concurrent
+        self.user_rate = user_rate_per_min / 60
+        self.user_burst = user_burst
+        self._priority = _Lane()
+        self._normal = _Lane()
+        self._running = 0
+        self._user_running = {}
+        self._priority_streak = 0
+        self._buckets = OrderedDict()
+        self._waits = deque(maxlen=1000)
+        self.rejected = 0
+        self.rate_limited = 0
+        self.ready = False
+
+    @property
+    def waiting(self):
+        return self._priority.size + self._normal.size
+
+    def check_rate(self, user_id, tokens=1):
+        # Token bucket per user; raises RateLimited when they send too fast
+        bucket = self._buckets.pop(user_id, None) or TokenBucket(self.user_rate, self.user_burst)
+        self._buckets[user_id] = bucket
+        while len(self._buckets) > self.MAX_BUCKETS:
+            self._buckets.popitem(last=False)
+        if not bucket.try_acquire(min(tokens, self.user_burst)):
+            self.rate_limited += 1
+            raise RateLimited()
+
+    def set_ready(self):
+        self.ready = True
+        self._dispatch()
+
+    def _can_run(self, user_id):
+        return self._user_running.get(user_id, 0) < self.user_max_concurrent
+
+    def _dispatch(self):
+        while self.ready and self._running < self.capacity and self.waiting:
+            lanes = (self._priority, self._normal)
+            if self._priority_streak >= self.PRIORITY_BURST:
+                lanes = (self._normal, self._priority)
+            job = None
+            for lane in lanes:
+                job = lane.pop(self._can_run)
+                if job:
+                    self._priority_streak = self._priority_streak + 1 if lane is self._priority else 0
+                    break
+            if job is None:
+                return  # everyone waiting is at their per-user cap
+            self._running += 1
+            self._user_running[job.user_id] = self._user_running.get(job.user_id, 0) + 1
+            waited = time.monotonic() - job.submitted
+            self._waits.append(waited)
+            metrics.observe_stage("queue_wait", waited)
+            job.granted.set_result(None)
+
+    def _release(self, user_id):
+        self._running -= 1
+        left = self._user_running.get(user_id, 1) - 1
+        if left:
+            self._user_running[user_id] = left
+        else:
+            self._user_running.pop(user_id, None)
+        self._dispatch()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, user_id, chat_id, priority=False, on_queued=None):
+        if self.waiting >= self.queue_size:
+            self.rejected += 1
+            raise QueueFull(self.waiting)
+        job = _Job(user_id, chat_id)
+        lane = self._priority if priority else self._normal
+        lane.push(job)
+        self._dispatch()
+        if not job.granted.done():
+            try:
+                if on_queued:
+                    await on_queued(self.waiting)
+                # Shielded: cancelling the caller must not cancel the grant,
+                # which tells whether a slot was handed out
+                await asyncio.shield(job.granted)
+            except BaseException:
+                # Cancelled, or on_queued failed: give the slot back or leave the queue
+                if job.granted.done():
+                    self._release(user_id)
+                else:
+                    lane.remove(job)
+                raise
+        try:
+            yield
+        finally:
+            self._release(user_id)
+
+    def stats(self):
+        waits = sorted(self._waits)
+
+        def pct(p):
+            return waits[min(len(waits) - 1, int(len(waits) * p))] if waits else 0.0
+
+        return {
+            "running": self._running,
+            "waiting": self.waiting,
+            "waiting_priority": self._priority.size,
+            "waiting_normal": self._normal.size,
+            "wait_p50": pct(0.5),
+            "wait_p95": pct(0.95),
+            "rejected": self.rejected,
+            "rate_limited": self.rate_limited,
+            "ready": self.ready,
+        }
@@ -0,0 +1,80 @@
+import re
+from collections import OrderedDict
+
+from config import SPELLCHECK_LANGS, SPELLCHECK_CACHE_SIZE, SPELLCHECK_SKIP_CONFIDENCE
+
+# Tesseract language code -> autocorrect language code
+AUTOCORRECT_LANGS = {
+    "eng": "en", "pol": "pl", "rus": "ru", "ukr": "uk", "tur": "tr", "spa": "es",
+    "por": "pt", "ces": "cs", "ell": "el", "ita": "it", "fra": "fr",
+}
+
+# Loaded lazily, once per worker process
+_spellers = {}
+# Bounded memo of (language, word) -> correction; most OCR text repeats words
+_memo = OrderedDict()
+
+
+def _get_speller(code):
+    speller = _spellers.get(code)
+    if speller is None:
+        from autocorrect import Speller
+        speller = _spellers[code] = Speller(lang=code)
+    return speller
+
+
+def _correct_word(code, word):
+    key = (code, word)
+    fixed = _memo.get(key)
+    if fixed is not None:
+        _memo.move_to_end(key)
+        return fixed
+    fixed = _get_speller(code).autocorrect_word(word)
+    _memo[key] = fixed
+    if len(_memo) > SPELLCHECK_CACHE_SIZE:
+        _memo.popitem(last=False)
+    return fixed
+
+
+def preload(lang):
+    # Load the dictionaries correct() would use for lang ahead of time
+    for tess_lang in lang.split("+"):
+        code = AUTOCORRECT_LANGS.get(tess_lang)
+        if code is not None and tess_lang in SPELLCHECK_LANGS:
+            _get_speller(code)
+
+
+def supports(lang):
+    # True if any part of lang ("eng+hin") will be spell-checked
+    return any(l in SPELLCHECK_LANGS and l in AUTOCORRECT_LANGS for l in lang.split("+"))
+
+
+def correct(text, lang, confidences=None):
+    # Spell-correct only the parts of lang ("eng+hin") that have a dictionary,
+    # and only tokens written in that dictionary's alphabet. Words Tesseract is
+    # already confident about (confidences: word -> 0..100) are left alone.
+    from autocorrect.constants import word_regexes
+
+    confidences = confidences or {}
+    for tess_lang in lang.split("+"):
+        code = AUTOCORRECT_LANGS.get(tess_lang)
+        if code is None or tess_lang not in SPELLCHECK_LANGS:
+            continue
+
+        # Whole tokens only: a Latin regex must not match inside "naïve" or mixed scripts
+        token = re.compile(rf"(?<!\w){word_regexes[code]}(?!\w)")
+        # Tesseract's words keep their punctuation ("fine."); key the
+        # confidences by the same tokens the text is matched with
+        confident = set()
+        for raw, conf in confidences.items():
+            if conf >= SPELLCHECK_SKIP_CONFIDENCE:
+                confident.update(m.group(0) for m in token.finditer(raw))
+
+        def fix(match):
+            word = match.group(0)
+            if word in confident:
+                return word
+            return _correct_word(code, word)
+
+        text = token.sub(fix, text)
+    return text
@@ -0,0 +1,50 @@
+import logging
+import time
+from contextlib import contextmanager
+
+log = logging.getLogger("startup")
+
+
+class StartupTimer:
+    """Where restart-to-first-reply time goes.
+
+    mark() closes a sequential phase (everything since the previous mark);
+    phase() times a block that may overlap others, like the worker warm-up
+    running while Telegram connects.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases = {}
+        self.total = None
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases[name] = now - self._last
+        self._last = now
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start
+
+    def done(self):
+        # Startup ends when the bot can answer OCR requests
+        self.total = time.perf_counter() - self.started
+        log.info("ready in %.2fs: %s", self.total,
+                 ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.phases.items()))
+
+    def gauge(self):
+        # Label tuples for metrics.gauge
+        values = {(("phase", name),): seconds for name, seconds in self.phases.items()}
+        if self.total is not None:
+            values[(("phase", "total"),)] = self.total
+        return values
+
+
+# Created on import: bot imports this first, so "imports" covers the rest
+timer = StartupTimer()
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import time
+
+from pyrogram.enums import ChatAction
+from pyrogram.errors import FloodWait, MessageNotModified
+
+from config import STATUS_DELAY, STATUS_EDIT_INTERVAL, OUTBOUND_RATE, OUTBOUND_CHAT_RATE, OUTBOUND_GROUP_RATE
+import metrics
+from ratelimit import TokenBucket
+
+log = logging.getLogger(__name__)
+
+CHAT_BURST = 3  # calls a quiet chat may make at once
+ACTION_REFRESH = 4.5  # seconds; Telegram shows a chat action for about 5
+MAX_CHATS = 1000  # per-chat limiters kept before idle ones are dropped
+
+
+class OutboundLimiter:
+    """Shared limit for Bot API calls into chats: one token bucket under
+    Telegram's global limit and one per chat (private chats about 1/s,
+    groups 20/min). A FloodWait pauses the chat for as long as Telegram
+    asks instead of failing the request."""
+
+    def __init__(self, rate=OUTBOUND_RATE, chat_rate=OUTBOUND_CHAT_RATE, group_rate=OUTBOUND_GROUP_RATE / 60):
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self._global = TokenBucket(rate)
+        self._chats = {}
+        self._paused = {}  # chat_id -> monotonic time the FloodWait ends
+
+    def _bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_CHATS:
+                self._prune()
+            # Group and channel ids are negative
+            rate = self.group_rate if chat_id < 0 else self.chat_rate
+            bucket = self._chats[chat_id] = TokenBucket(rate, capacity=CHAT_BURST)
+        return bucket
+
+    def _prune(self):
+        now = time.monotonic()
+        for chat_id in [c for c, bucket in self._chats.items() if bucket.idle()]:
+            del self._chats[chat_id]
+        for chat_id in [c for c, until in self._paused.items() if until <= now]:
+            del self._paused[chat_id]
+
+    async def acquire(self):
+        # A token under the global limit only, for senders with their own
+        # per-chat and FloodWait handling (broadcasts)
+        await self._global.acquire()
+
+    async def call(self, chat_id, fn, *args, wait=True, **kwargs):
+        """Await ``fn(*args, **kwargs)``, a client or message method acting
+        on ``chat_id``, within the limits. With wait=False the call is
+        skipped (returning None) rather than waiting for the chat's limit or
+        a FloodWait: for updates that a later one replaces anyway."""
+        method = getattr(fn, "__name__", "call")
+        bucket = self._bucket(chat_id)
+        while True:
+            paused = self._paused.get(chat_id, 0) - time.monotonic()
+            if paused > 0:
+                if not wait:
+                    metrics.TELEGRAM_CALLS.inc(method=method, result="skipped")
+                    return None
+                await asyncio.sleep(paused)
+                continue
+            if wait:
+                await bucket.acquire()
+            elif not bucket.try_acquire():
+                metrics.TELEGRAM_CALLS.inc(method=method, result="skipped")
+                return None
+            await self._global.acquire()
+            try:
+                result = await fn(*args, **kwargs)
+            except FloodWait as e:
+                metrics.TELEGRAM_CALLS.inc(method=method, result="flood_wait")
+                self._paused[chat_id] = max(self._paused.get(chat_id, 0), time.monotonic() + e.value + 1)
+                log.warning("FloodWait %ss in chat %s (%s)", e.value, chat_id, method)
+                if not wait:
+                    return None
+                continue
+            except Exception:
+                metrics.TELEGRAM_CALLS.inc(method=method, result="error")
+                raise
+            metrics.TELEGRAM_CALLS.inc(method=method, result="ok")
+            return result
+
+
+class StatusMessage:
+    """Progress of one request, in as few API calls as possible.
+
+    For the first ``delay`` seconds the chat only shows a chat action
+    ("typing…"). A job still running by then, or one that show() is called
+    for (queued, overloaded), gets a status message replying to the
+    request. Updates are coalesced: only the newest text is sent, at most
+    once per ``edit_interval`` and within the chat's outbound limit.
+    finish() edits the status message into the result, or replies with it
+    when there is none, so a quick job costs a chat action and one reply.
+    """
+
+    def __init__(self, limiter, message, delay=STATUS_DELAY, edit_interval=STATUS_EDIT_INTERVAL,
+                 action=ChatAction.TYPING, shown=None):
+        self.limiter = limiter
+        self.message = message  # the request; status and result reply to it
+        self.chat_id = message.chat.id
+        self.delay = delay
+        self.edit_interval = edit_interval
+        self.action = action
+        self.shown = shown  # the status message once sent
+        self._text = self._sent = None  # (text, parse_mode): newest and on screen
+        self._urgent = False
+        self._wake = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._task = None
+
+    def start(self, text):
+        self._text = (text, None)
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def update(self, text, parse_mode=None):
+        # Cheap: only remembered, sent when the status is (or becomes) visible
+        self._text = (text, parse_mode)
+        if self.shown is not None:
+            self._wake.set()
+
+    def show(self, text, parse_mode=None):
+        # Worth a message right away, e.g. the job is waiting in a queue
+        self._text = (text, parse_mode)
+        self._urgent = True
+        self._wake.set()
+
+    async def _wait(self, event, timeout=None):
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self):
+        deadline = time.monotonic() + self.delay
+        while self.shown is None and not self._urgent and not self._closing.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                await self.limiter.call(self.chat_id, self.message.reply_chat_action, self.action, wait=False)
+            except Exception as e:
+                log.debug("chat action failed: %s", e)
+            await self._wait(self._wake, min(ACTION_REFRESH, remaining))
+        while not self._closing.is_set():
+            self._wake.clear()
+            if self._text != self._sent:
+                await self._send()
+                # Throttle, but close() need not wait for it
+                await self._wait(self._closing, self.edit_interval)
+            else:
+                await self._wake.wait()
+
+    async def _send(self):
+        text, parse_mode = self._text
+        try:
+            if self.shown is None:
+                self.shown = await self.limiter.call(self.chat_id, self.message.reply, text, parse_mode=parse_mode,
+                                                     reply_to_message_id=self.message.id)
+            elif await self.limiter.call(self.chat_id, self.shown.edit, text, parse_mode=parse_mode, wait=False) is None:
+                return  # over the chat's limit; the newest text is tried again later
+        except MessageNotModified:
+            pass
+        except Exception as e:
+            log.info("status update failed: %s", e)
+        self._sent = (text, parse_mode)
+
+    async def close(self):
+        # Stops updates (an edit under way completes first); the status
+        # message stays as it is
+        self._closing.set()
+        self._wake.set()
+        if self._task:
+            task, self._task = self._task, None
+            try:
+                await task
+            except Exception as e:
+                log.info("status task failed: %s", e)
+
+    async def finish(self, text, parse_mode=None, reply_markup=None):
+        """Show ``text`` as the final message of the request and return it."""
+        await self.close()
+        if self.shown is not None and not self.shown.empty:
+            try:
+                return await self.limiter.call(self.chat_id, self.shown.edit, text, parse_mode=parse_mode,
+                                               reply_markup=reply_markup)
+            except MessageNotModified:
+                return self.shown
+            except Exception as e:
+                # Deleted meanwhile, or too old to edit: reply instead
+                log.info("editing status into the result failed: %s", e)
+        return await self.limiter.call(self.chat_id, self.message.reply, text, parse_mode=parse_mode,
+                                       reply_to_message_id=self.message.id, reply_markup=reply_markup)
+
+    async def delete(self):
+        await self.close()
+        if self.shown is not None and not self.shown.empty:
+            try:
+                await self.limiter.call(self.chat_id, self.shown.delete)
+            except Exception as e:
+                log.info("deleting status failed: %s", e)
+            self.shown = None
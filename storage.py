@@ -0,0 +1,303 @@
+import asyncio
+import datetime
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from config import STORAGE_PATH, STORAGE_FLUSH_INTERVAL
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    first_name TEXT, last_name TEXT, username TEXT,
+    requests INTEGER NOT NULL DEFAULT 0,
+    first_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lang_prefs (user_id INTEGER PRIMARY KEY, lang TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS detected_langs (user_id INTEGER PRIMARY KEY, lang TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS spell_prefs (chat_id INTEGER PRIMARY KEY, enabled INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS ai_quota (user_id INTEGER PRIMARY KEY, day TEXT NOT NULL, used INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# Legacy flat files, imported once on first start. ai_quota.txt is left out:
+# it was never reset, so its counts say nothing about today's usage.
+LEGACY_FILES = {
+    "users": "users.txt",
+    "lang_prefs": "lang_prefs.txt",
+    "stats": "stats.txt",
+    "detected_langs": "detected_langs.txt",
+    "spell_prefs": "spell_prefs.txt",
+}
+
+
+def today():
+    return datetime.datetime.utcnow().strftime("%Y-%m-%d")
+
+
+class Storage:
+    """Bot state in SQLite (WAL).
+
+    Reads are served from memory. Writes are applied to memory immediately
+    and queued; a background task flushes them in one transaction every
+    STORAGE_FLUSH_INTERVAL seconds, in a thread, so handlers never touch disk.
+    """
+
+    def __init__(self, path=STORAGE_PATH, flush_interval=STORAGE_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._task = None
+        self._reset_pending()
+        self.import_legacy_files()
+        self._load()
+
+    def _reset_pending(self):
+        self._new_users = {}
+        self._user_requests = {}
+        self._lang_prefs = {}
+        self._detected = {}
+        self._spell = {}
+        self._quota = {}
+        self._counters = {}
+        self._pruned = set()
+
+    def _load(self):
+        db = self._db
+        self.known_users = {row[0] for row in db.execute("SELECT user_id FROM users")}
+        self.lang_prefs = dict(db.execute("SELECT user_id, lang FROM lang_prefs"))
+        self.detected_langs = dict(db.execute("SELECT user_id, lang FROM detected_langs"))
+        self.spell_prefs = {cid: bool(on) for cid, on in db.execute("SELECT chat_id, enabled FROM spell_prefs")}
+        self.quota_day = today()
+        self.ai_quota = dict(db.execute("SELECT user_id, used FROM ai_quota WHERE day = ?", (self.quota_day,)))
+        self.counters = dict(db.execute("SELECT name, value FROM counters"))
+
+    # --- reads (memory only) ---
+
+    def get_lang(self, user_id):
+        return self.lang_prefs.get(user_id)
+
+    def get_detected_lang(self, user_id):
+        return self.detected_langs.get(user_id)
+
+    def get_spell(self, chat_id):
+        return self.spell_prefs.get(chat_id, True)
+
+    def get_counter(self, name):
+        return self.counters.get(name, 0)
+
+    def ai_used_today(self, user_id):
+        self._roll_quota_day()
+        return self.ai_quota.get(user_id, 0)
+
+    def iter_user_ids(self):
+        # Fresh cursor over the table; safe to use while writes are queued
+        with self._db_lock:
+            return [row[0] for row in self._db.execute("SELECT user_id FROM users ORDER BY user_id")]
+
+    def export_users(self, path):
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT user_id, first_name, last_name, username FROM users ORDER BY first_seen"
+            ).fetchall()
+        with open(path, "w", encoding="utf-8") as f:
+            for uid, first, last, username in rows:
+                f.write(f"UserID: {uid} | First: {first} | Last: {last or ''} | Username: @{username or ''}\n")
+        return len(rows)
+
+    # --- writes (memory now, disk on next flush) ---
+
+    def log_user(self, user):
+        with self._lock:
+            if user.id not in self.known_users:
+                self.known_users.add(user.id)
+                self._pruned.discard(user.id)
+                self._new_users[user.id] = (user.first_name, user.last_name, user.username, time.time())
+            self._user_requests[user.id] = self._user_requests.get(user.id, 0) + 1
+
+    def prune_users(self, user_ids):
+        # Forget users that blocked the bot or were deleted; they come back
+        # through log_user if they ever write again
+        with self._lock:
+            for uid in user_ids:
+                self.known_users.discard(uid)
+                self._new_users.pop(uid, None)
+                self._user_requests.pop(uid, None)
+                self._pruned.add(uid)
+
+    def set_lang(self, user_id, lang):
+        with self._lock:
+            self.lang_prefs[user_id] = lang
+            self._lang_prefs[user_id] = lang
+
+    def set_detected_lang(self, user_id, lang):
+        if self.detected_langs.get(user_id) == lang:
+            return
+        with self._lock:
+            self.detected_langs[user_id] = lang
+            self._detected[user_id] = lang
+
+    def set_spell(self, chat_id, enabled):
+        with self._lock:
+            self.spell_prefs[chat_id] = enabled
+            self._spell[chat_id] = enabled
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def use_ai_quota(self, user_id):
+        self._roll_quota_day()
+        with self._lock:
+            used = self.ai_quota.get(user_id, 0) + 1
+            self.ai_quota[user_id] = used
+            self._quota[user_id] = (self.quota_day, used)
+
+    def _roll_quota_day(self):
+        # Daily reset: yesterday's usage simply stops counting
+        day = today()
+        if day != self.quota_day:
+            with self._lock:
+                self.quota_day = day
+                self.ai_quota = {}
+
+    # --- flushing ---
+
+    def flush(self):
+        with self._lock:
+            pending = (self._new_users, self._user_requests, self._lang_prefs, self._detected,
+                       self._spell, self._quota, self._counters, self._pruned)
+            self._reset_pending()
+        if not any(pending):
+            return
+        try:
+            self._write(*pending)
+        except Exception:
+            # Keep the batch for the next flush instead of losing it
+            self._restore_pending(*pending)
+            raise
+
+    def _restore_pending(self, new_users, requests, langs, detected, spell, quota, counters, pruned):
+        # Merge a failed batch under what was queued since: newer values win,
+        # counts add up, and a prune or re-add after the batch still applies
+        with self._lock:
+            pruned = (pruned - self._new_users.keys()) | self._pruned
+            self._new_users = {uid: info for uid, info in {**new_users, **self._new_users}.items()
+                               if uid not in self._pruned}
+            for uid, n in requests.items():
+                if uid not in self._pruned:
+                    self._user_requests[uid] = self._user_requests.get(uid, 0) + n
+            self._lang_prefs = {**langs, **self._lang_prefs}
+            self._detected = {**detected, **self._detected}
+            self._spell = {**spell, **self._spell}
+            self._quota = {**quota, **self._quota}
+            for name, n in counters.items():
+                self._counters[name] = self._counters.get(name, 0) + n
+            self._pruned = pruned
+
+    def _write(self, new_users, requests, langs, detected, spell, quota, counters, pruned):
+        with self._db_lock, self._db:
+            db = self._db
+            db.executemany(
+                "INSERT OR IGNORE INTO users (user_id, first_name, last_name, username, first_seen) VALUES (?, ?, ?, ?, ?)",
+                [(uid, *info) for uid, info in new_users.items()],
+            )
+            db.executemany("DELETE FROM users WHERE user_id = ?", [(uid,) for uid in pruned])
+            db.executemany("UPDATE users SET requests = requests + ? WHERE user_id = ?",
+                           [(n, uid) for uid, n in requests.items()])
+            db.executemany("INSERT OR REPLACE INTO lang_prefs (user_id, lang) VALUES (?, ?)", langs.items())
+            db.executemany("INSERT OR REPLACE INTO detected_langs (user_id, lang) VALUES (?, ?)", detected.items())
+            db.executemany("INSERT OR REPLACE INTO spell_prefs (chat_id, enabled) VALUES (?, ?)",
+                           [(cid, int(on)) for cid, on in spell.items()])
+            db.executemany("INSERT OR REPLACE INTO ai_quota (user_id, day, used) VALUES (?, ?, ?)",
+                           [(uid, day, used) for uid, (day, used) in quota.items()])
+            db.executemany(
+                "INSERT INTO counters (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                counters.items(),
+            )
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception:
+                log.exception("storage flush failed")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await asyncio.to_thread(self.flush)
+        with self._db_lock:
+            self._db.close()
+
+    # --- one-time import of the old text files ---
+
+    def import_legacy_files(self, directory="."):
+        db = self._db
+        if db.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone():
+            return
+        paths = {name: os.path.join(directory, fname) for name, fname in LEGACY_FILES.items()}
+
+        def lines(name):
+            if not os.path.exists(paths[name]):
+                return []
+            with open(paths[name], "r", encoding="utf-8") as f:
+                return [line.strip() for line in f if line.strip()]
+
+        now = time.time()
+        with db:
+            for line in lines("users"):
+                # UserID: 1 | First: A | Last: B | Username: @c
+                fields = {}
+                for part in line.split("|"):
+                    key, _, value = part.partition(":")
+                    fields[key.strip()] = value.strip()
+                try:
+                    uid = int(fields.get("UserID", ""))
+                except ValueError:
+                    continue
+                db.execute(
+                    "INSERT OR IGNORE INTO users (user_id, first_name, last_name, username, first_seen) VALUES (?, ?, ?, ?, ?)",
+                    (uid, fields.get("First"), fields.get("Last") or None,
+                     fields.get("Username", "@").lstrip("@") or None, now),
+                )
+            for name, table in (("lang_prefs", "lang_prefs"), ("detected_langs", "detected_langs")):
+                for line in lines(name):
+                    uid, _, lang = line.partition(":")
+                    if uid.isdigit() and lang:
+                        db.execute(f"INSERT OR REPLACE INTO {table} (user_id, lang) VALUES (?, ?)", (int(uid), lang))
+            for line in lines("spell_prefs"):
+                cid, _, state = line.partition(":")
+                if cid.lstrip("-").isdigit():
+                    db.execute("INSERT OR REPLACE INTO spell_prefs (chat_id, enabled) VALUES (?, ?)",
+                               (int(cid), int(state == "on")))
+            for line in lines("stats"):
+                # stats.txt mixed "total:N" counters with "<user_id>:N" request counts
+                key, _, value = line.partition(":")
+                if not value.isdigit():
+                    continue
+                if key.isdigit():
+                    db.execute("UPDATE users SET requests = ? WHERE user_id = ?", (int(value), int(key)))
+                else:
+                    db.execute("INSERT OR REPLACE INTO counters (name, value) VALUES (?, ?)", (key, int(value)))
+            db.execute("INSERT INTO meta (key, value) VALUES ('legacy_imported', ?)", (str(now),))
+        log.info("imported legacy state files into %s", self.path)
@@ -0,0 +1,132 @@
+import difflib
+
+import numpy as np
+from PIL import Image
+
+from config import TILE_MIN_HEIGHT, TILE_HEIGHT, TILE_OVERLAP
+from media import source_to_file
+import ocr_utils
+from preprocess import otsu
+from progressive import run_in_order
+
+# Rows with less ink than this share of the width count as blank
+BLANK_ROW_INK = 0.002
+MIN_GAP = 3  # blank rows needed between two lines to cut there
+
+
+def needs_tiling(source, min_height=TILE_MIN_HEIGHT):
+    # Reads only the image header
+    with Image.open(source_to_file(source)) as img:
+        return img.height >= min_height
+
+
+def find_cuts(binary, tile_height=TILE_HEIGHT, overlap=TILE_OVERLAP):
+    """Split rows of a black-on-white image into (top, bottom, overlapped) tiles.
+
+    Cuts go through the middle of blank gaps between text lines (horizontal
+    projection profile) close to every ``tile_height`` rows. Where no gap is
+    found, e.g. inside a photo, the cut goes through the row with the least
+    ink and both tiles get ``overlap`` extra rows; ``overlapped`` tells
+    stitch() to drop the lines that then appear in both.
+    """
+    ink = (np.asarray(binary) == 0).sum(axis=1)
+    height = len(ink)
+    if height <= tile_height * 1.5:
+        return [(0, height, False)]
+
+    blank = ink <= max(1, binary.width * BLANK_ROW_INK)
+    edges = np.diff(np.concatenate(([0], blank.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    gaps = np.array([(s + e) // 2 for s, e in zip(starts, ends) if e - s >= MIN_GAP])
+
+    tiles = []
+    top, overlapped = 0, False
+    window = tile_height // 3
+    while height - top > tile_height * 1.5:
+        target = top + tile_height
+        lo, hi = target - window, target + window
+        near = gaps[(gaps >= lo) & (gaps <= hi)] if len(gaps) else gaps
+        if len(near):
+            cut = int(near[np.argmin(np.abs(near - target))])
+            tiles.append((top, cut, overlapped))
+            top, overlapped = cut, False
+        else:
+            cut = lo + int(np.argmin(ink[lo:hi]))
+            tiles.append((top, min(height, cut + overlap), overlapped))
+            top, overlapped = max(0, cut - overlap), True
+    tiles.append((top, height, overlapped))
+    return tiles
+
+
+def plan_tiles(source, lang=None, hint=None, tile_height=TILE_HEIGHT, overlap=TILE_OVERLAP):
+    # Runs in a pool worker. Returns (tiles, lang); the language is detected
+    # once, on the first tile, because OSD on a thumbnail of a very tall
+    # image sees only unreadably small text
+    img = Image.open(source_to_file(source)).convert("L")
+    tiles = find_cuts(otsu(img), tile_height, overlap)
+    if not lang:
+        top, bottom, _ = tiles[0]
+        first = ocr_utils.preprocess_image(img.crop((0, top, img.width, bottom)))
+        lang = ocr_utils.pick_langs(ocr_utils.detect_script(first), hint)
+    return tiles, lang
+
+
+def ocr_tile(source, top, bottom, lang, timeout=0, spell=True):
+    # Runs in a pool worker: decode, crop one band and OCR it
+    with Image.open(source_to_file(source)) as img:
+        band = img.crop((0, top, img.width, bottom))
+    return ocr_utils.ocr_image(band, lang=lang, timeout=timeout, spell=spell)
+
+
+def _same_line(a, b):
+    a, b = " ".join(a.split()), " ".join(b.split())
+    return a == b or (min(len(a), len(b)) >= 4 and difflib.SequenceMatcher(None, a, b).ratio() >= 0.8)
+
+
+def _overlap(previous, lines, max_lines=4):
+    # Longest run of lines ending `previous` that `lines` starts with again
+    for k in range(min(max_lines, len(previous), len(lines)), 0, -1):
+        if all(_same_line(a, b) for a, b in zip(previous[-k:], lines[:k])):
+            return k
+    return 0
+
+
+def stitch(texts, overlapped):
+    """Join tile texts in reading order, dropping lines repeated across
+    overlapping cuts."""
+    out = []
+    for text, has_overlap in zip(texts, overlapped):
+        if text == "No text found.":
+            continue
+        lines = text.splitlines()
+        if has_overlap and out:
+            # Both tiles read the rows around the cut; keep the later tile's
+            # copy, the earlier one may end with a line cut in half
+            tail = [i for i, line in enumerate(out) if line.strip()][-4:]
+            k = _overlap([out[i] for i in tail], lines)
+            if k:
+                del out[tail[-k]:]
+        out.extend(lines)
+    return "\n".join(out).strip() or "No text found."
+
+
+async def ocr_tiled(run, source, lang=None, hint=None, spell=True, timeout=0, on_progress=None):
+    """Tiled OCR of one tall image. ``run(fn, *args, **kwargs)`` executes fn in
+    a worker (OCRPool.run, possibly behind the scheduler); tiles run in
+    parallel as far as ``run`` allows. ``on_progress(text so far, tiles
+    done, tiles)`` follows the stitched text top down. Returns (text, lang used)."""
+    tiles, lang = await run(plan_tiles, source, lang=lang, hint=hint)
+    overlapped = [overlapped for _, _, overlapped in tiles]
+
+    async def report(results):
+        if any(text.startswith("OCR error") for text, _ in results):
+            return
+        await on_progress(stitch([text for text, _ in results], overlapped), len(results), len(tiles))
+
+    calls = [(ocr_tile, (source, top, bottom, lang), dict(timeout=timeout, spell=spell)) for top, bottom, _ in tiles]
+    results = await run_in_order(run, calls, report if on_progress else None)
+    errors = [text for text, _ in results if text.startswith("OCR error")]
+    if errors:
+        # Text with a band missing would be sent, and cached, as complete
+        return errors[0], lang
+    return stitch([text for text, _ in results], overlapped), lang
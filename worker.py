@@ -0,0 +1,154 @@
+"""OCR worker for distributed mode (OCR_MODE=distributed).
+
+    python worker.py                 # consume jobs until stopped
+    python worker.py --stats         # queue counts by state
+    python worker.py --requeue-dead  # retry every dead-lettered job
+
+Leases jobs from the shared queue (JOBQUEUE_PATH), downloads the media by
+file_id with its own bot session, runs OCR in a local process pool and
+stores the result for the bot to deliver. Run as many as you like.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+
+from config import API_ID, API_HASH, BOT_TOKEN, OCR_WORKERS, JOBQUEUE_POLL_INTERVAL, TILE_MIN_HEIGHT, WARMUP_TIMEOUT
+from documents import plan_pages
+from jobqueue import JobQueue
+from ocr_pool import OCRPool
+from ocr_utils import ocr_image, ocr_page, warm_up
+from tiling import needs_tiling, ocr_tiled
+import media as media_io
+
+log = logging.getLogger("worker")
+
+
+class Worker:
+    def __init__(self, queue, client, pool, concurrency=OCR_WORKERS, poll_interval=JOBQUEUE_POLL_INTERVAL):
+        self.queue = queue
+        self.client = client
+        self.pool = pool
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = asyncio.Event()
+        # Pages of all jobs in flight share the pool without queueing in it
+        self._feed = asyncio.Semaphore(pool.workers)
+
+    async def process(self, payload):
+        # Mirrors run_batch_ocr in bot.py: expand pages, OCR them in parallel, keep page order
+        files = await asyncio.gather(*(
+            media_io.download_file_id(self.client, item["file_id"], item["file_size"]) for item in payload["items"]
+        ))
+        try:
+            pages, skipped = await asyncio.to_thread(
+                plan_pages, [(file.source, item["kind"]) for file, item in zip(files, payload["items"])]
+            )
+
+            async def run(fn, *args, **kwargs):
+                async with self._feed:
+                    return await self.pool.run(fn, *args, **kwargs)
+
+            async def ocr_one(i, kind, index):
+                source = files[i].source
+                options = dict(lang=payload["lang"], hint=payload["hint"], spell=payload["spell"])
+                try:
+                    if kind:
+                        return await run(ocr_page, source, kind, index, timeout=self.pool.timeout, **options)
+                    if TILE_MIN_HEIGHT and await asyncio.to_thread(needs_tiling, source):
+                        return await ocr_tiled(run, source, timeout=self.pool.timeout, **options)
+                    return await run(ocr_image, source, timeout=self.pool.timeout, **options)
+                except asyncio.TimeoutError:
+                    # Retrying would time out again; report it like the local mode does
+                    return "OCR error: timed out", payload["lang"]
+
+            results = await asyncio.gather(*(ocr_one(*page) for page in pages))
+        finally:
+            for file in files:
+                file.discard()
+        return {"texts": [text for text, _ in results], "langs": [lang for _, lang in results], "skipped": skipped}
+
+    async def _run_job(self, job_id, payload, attempt):
+        async def keep_leased():
+            while True:
+                await asyncio.sleep(self.queue.lease / 3)
+                if not await asyncio.to_thread(self.queue.heartbeat, job_id, self.name):
+                    log.warning("job %s: lease lost", job_id)
+                    return
+
+        heartbeat = asyncio.create_task(keep_leased())
+        try:
+            result = await self.process(payload)
+        except Exception as e:
+            outcome = await asyncio.to_thread(self.queue.fail, job_id, self.name, f"{type(e).__name__}: {e}")
+            log.warning("job %s attempt %s failed (%s): %s", job_id, attempt, outcome, e)
+            return
+        finally:
+            heartbeat.cancel()
+        if await asyncio.to_thread(self.queue.complete, job_id, self.name, result):
+            log.info("job %s done, %s page(s)", job_id, len(result["texts"]))
+        else:
+            log.warning("job %s finished after its lease was taken over, result dropped", job_id)
+
+    async def _loop(self):
+        while not self._stopping.is_set():
+            job = await asyncio.to_thread(self.queue.lease_job, self.name)
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run_job(*job)
+
+    async def run(self):
+        log.info("worker %s: %s concurrent job(s)", self.name, self.concurrency)
+        await asyncio.gather(*(self._loop() for _ in range(self.concurrency)))
+
+    def stop(self):
+        # Jobs in flight finish; their leases would expire anyway if we were killed
+        self._stopping.set()
+
+
+async def main():
+    queue = JobQueue()
+    pool = OCRPool(initializer=warm_up)
+    # Imported here: spawn re-imports this module in every pool process
+    from pyrogram import Client
+    # in_memory session: several workers can share a host without fighting over a session file
+    client = Client(f"ocrworker-{os.getpid()}", api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN,
+                    in_memory=True, no_updates=True)
+    # Models load while we connect; jobs are only leased once the pool is warm
+    warming = asyncio.create_task(asyncio.wait_for(pool.warm_up(), WARMUP_TIMEOUT))
+    await client.start()
+    try:
+        await warming
+    except Exception as e:
+        log.warning("OCR worker warm-up did not finish, serving anyway: %r", e)
+    worker = Worker(queue, client, pool)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        await client.stop()
+        pool.shutdown()
+        queue.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stats", action="store_true", help="print queue counts by state and exit")
+    parser.add_argument("--requeue-dead", action="store_true", help="put dead-lettered jobs back in the queue")
+    args = parser.parse_args()
+    if args.stats:
+        print(JobQueue().stats())
+    elif args.requeue_dead:
+        print(f"requeued {JobQueue().requeue_dead()} job(s)")
+    else:
+        asyncio.run(main())